@@ -0,0 +1,42 @@
+"""Add unique index on patients.phone_number
+
+Precondition: no two patients may share a phone number. The upgrade checks
+first and aborts with the duplicated numbers listed so they can be merged by hand.
+
+Revision ID: 9b1d4e7a2c53
+Revises: cf2aa9130cdb
+Create Date: 2026-10-17 09:14:52.381047
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b1d4e7a2c53'
+down_revision = 'cf2aa9130cdb'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    duplicates = op.get_bind().execute(sa.text(
+        "SELECT phone_number, count(*) FROM patients "
+        "WHERE phone_number IS NOT NULL "
+        "GROUP BY phone_number HAVING count(*) > 1 "
+        "ORDER BY phone_number"
+    )).fetchall()
+    if duplicates:
+        listed = ", ".join(f"{phone_number} ({count} patients)" for phone_number, count in duplicates)
+        raise RuntimeError(
+            "Cannot add the unique index on patients.phone_number: these phone numbers "
+            f"belong to more than one patient: {listed}. Merge or correct them and re-run the upgrade."
+        )
+    
+    # Login and signup look patients up by phone number; signup already rejects
+    # duplicates, the index enforces it and turns the lookup into an index scan
+    op.create_index(op.f('ix_patients_phone_number'), 'patients', ['phone_number'], unique=True)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_patients_phone_number'), table_name='patients')
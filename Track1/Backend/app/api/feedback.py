@@ -15,9 +15,12 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 router = APIRouter()
 
 
+# Feedback endpoints are plain def: translation, analysis, transcription and the database
+# calls all block, so FastAPI runs them in its threadpool instead of on the event loop
+
 # 1. Text-only feedback endpoint
 @router.post("/feedback/", response_model=Feedback)
-async def create_feedback(
+def create_feedback(
     patient_id: str = Form(...),
     rating: int = Form(None),
     feedback_text: str = Form(...),
@@ -57,7 +60,7 @@ async def create_feedback(
 
 # 2. Audio feedback endpoint
 @router.post("/feedback/audio/", response_model=Feedback)
-async def create_audio_feedback(
+def create_audio_feedback(
     patient_id: str = Form(...),
     rating: int = Form(None),
     language: str = Form(...),
@@ -67,7 +70,7 @@ async def create_audio_feedback(
     # Save uploaded audio file
     file_location = os.path.join(UPLOAD_DIR, f"{patient_id}_{audio.filename}")
     with open(file_location, "wb") as f:
-        content = await audio.read()
+        content = audio.file.read()
         f.write(content)
 
     # Read file for transcription
@@ -10,7 +10,7 @@ from app.schemas.patient import (
 )
 from app.services.patient_service import PatientService
 from uuid import UUID
-from typing import List
+from typing import List, Optional
 
 router = APIRouter()
 
@@ -184,7 +184,7 @@ def get_my_profile(
     **Errors:**
     - 404: Patient not found
     """
-    patient = db.query(PatientModel).filter(PatientModel.patient_id == patient_id).first()
+    patient = db.get(PatientModel, patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     return patient
@@ -212,7 +212,7 @@ def read_patient(patient_id: UUID, db: Session = Depends(get_db)):
     **Errors:**
     - 404: Patient not found
     """
-    patient = db.query(PatientModel).filter(PatientModel.patient_id == patient_id).first()
+    patient = db.get(PatientModel, patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     return patient
@@ -224,6 +224,7 @@ def read_patient(patient_id: UUID, db: Session = Depends(get_db)):
 def list_patients(
     limit: int = Query(100, description="Maximum number of patients to return", ge=1, le=1000),
     offset: int = Query(0, description="Number of patients to skip", ge=0),
+    after_id: Optional[UUID] = Query(None, description="Return patients after this patient ID (keyset pagination)"),
     db: Session = Depends(get_db)
 ):
     """
@@ -232,6 +233,7 @@ def list_patients(
     **Query Parameters:**
     - limit: Maximum number of patients to return (1-1000, default: 100)
     - offset: Number of patients to skip for pagination (default: 0)
+    - after_id: patient_id of the last patient on the previous page
     
     **Open Access:** No authentication required
     
@@ -239,11 +241,27 @@ def list_patients(
     ```
     GET /api/patient/                    # Get first 100 patients
     GET /api/patient/?limit=50&offset=100 # Get patients 101-150
+    GET /api/patient/?limit=50&after_id=123e4567-e89b-12d3-a456-426614174000 # Next 50 after that patient
     ```
     
+    **Pagination:** Patients are ordered by patient_id. Passing the last patient_id of a page
+    as after_id seeks straight to the next page, so deep pages cost the same as the first one.
+    
     **Returns:** List of all patients with pagination support
     """
-    return db.query(PatientModel).offset(offset).limit(limit).all()
+    # Only the response columns are selected, so password hashes are never loaded
+    query = db.query(
+        PatientModel.patient_id,
+        PatientModel.full_name,
+        PatientModel.phone_number,
+        PatientModel.email,
+        PatientModel.preferred_language,
+        PatientModel.created_at
+    )
+    if after_id:
+        query = query.filter(PatientModel.patient_id > after_id)
+    
+    return query.order_by(PatientModel.patient_id).offset(offset).limit(limit).all()
 
 @router.delete("/patient/{patient_id}",
                summary="Delete patient account",
@@ -269,7 +287,7 @@ def delete_patient(patient_id: UUID, db: Session = Depends(get_db)):
     **Errors:**
     - 404: Patient not found
     """
-    patient = db.query(PatientModel).filter(PatientModel.patient_id == patient_id).first()
+    patient = db.get(PatientModel, patient_id)
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
     
@@ -9,7 +9,9 @@ from typing import Optional
 # Security scheme for JWT Bearer token
 security = HTTPBearer()
 
-async def get_current_patient(
+# Both dependencies load the patient through a sync Session; as plain def they run in the threadpool
+
+def get_current_patient(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
 ) -> PatientModel:
@@ -32,7 +34,7 @@ async def get_current_patient(
     token = credentials.credentials
     return PatientService.get_current_patient(db, token)
 
-async def get_current_patient_optional(
+def get_current_patient_optional(
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(HTTPBearer(auto_error=False)),
     db: Session = Depends(get_db)
 ) -> Optional[PatientModel]:
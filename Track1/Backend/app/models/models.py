@@ -7,7 +7,7 @@ class Patient(Base):
     __tablename__ = "patients"
     patient_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     full_name = Column(String(200))
-    phone_number = Column(String(20))
+    phone_number = Column(String(20), unique=True, index=True)
     email = Column(String(255))
     preferred_language = Column(String(10))
     created_at = Column(TIMESTAMP)
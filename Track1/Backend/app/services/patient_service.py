@@ -129,9 +129,7 @@ class PatientService:
     @staticmethod
     def get_patient_by_id(db: Session, patient_id: UUID) -> Optional[PatientModel]:
         """Get a patient by their ID"""
-        return db.query(PatientModel).filter(
-            PatientModel.patient_id == patient_id
-        ).first()
+        return db.get(PatientModel, patient_id)
     
     @staticmethod
     def get_patient_by_phone(db: Session, phone_number: str) -> Optional[PatientModel]:
@@ -4,12 +4,13 @@ Handles automatic scheduling and sending of reminder SMS at appropriate times
 """
 
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import List, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import and_
 
-from app.db.database import get_db
+from app.db.database import get_db, SessionLocal
 from app.models.models import Reminder, Patient, ReminderDelivery
 from app.services.sms_service import sms_service
 from app.core.logging_config import get_logger
@@ -24,6 +25,8 @@ class ReminderScheduler:
         """Initialize the reminder scheduler"""
         self.is_running = False
         self.check_interval = 60  # Check every minute for due reminders
+        self.max_concurrent_sends = 10  # SMS sends in flight at once (each holds a DB connection)
+        self._send_executor = None  # created by start_scheduler, shut down when it stops
     
     async def start_scheduler(self):
         """Start the reminder scheduler background task"""
@@ -32,6 +35,10 @@ class ReminderScheduler:
             return
         
         self.is_running = True
+        send_executor = ThreadPoolExecutor(
+            max_workers=self.max_concurrent_sends, thread_name_prefix="reminder-sms"
+        )
+        self._send_executor = send_executor
         logger.info("Starting reminder scheduler...")
         
         try:
@@ -42,6 +49,9 @@ class ReminderScheduler:
             logger.error(f"Reminder scheduler error: {str(e)}")
         finally:
             self.is_running = False
+            send_executor.shutdown(wait=True)
+            if self._send_executor is send_executor:
+                self._send_executor = None
             logger.info("Reminder scheduler stopped")
     
     def stop_scheduler(self):
@@ -61,14 +71,18 @@ class ReminderScheduler:
             
             # Find active reminders that are due
             due_reminders = self._get_due_reminders(db, now, current_day)
+            db.close()
             
             if due_reminders:
                 logger.info(f"Found {len(due_reminders)} due reminders to send")
                 
-                for reminder in due_reminders:
-                    await self._send_reminder_notification(db, reminder)
-            
-            db.close()
+                # Twilio calls block, so the sends run on the scheduler's own thread pool:
+                # up to max_concurrent_sends at once instead of one after another
+                loop = asyncio.get_running_loop()
+                await asyncio.gather(*(
+                    loop.run_in_executor(self._send_executor, self._send_reminder_notification, reminder)
+                    for reminder in due_reminders
+                ))
             
         except Exception as e:
             logger.error(f"Error checking due reminders: {str(e)}")
@@ -160,8 +174,9 @@ class ReminderScheduler:
             logger.error(f"Error checking recent delivery: {str(e)}")
             return False
     
-    async def _send_reminder_notification(self, db: Session, reminder: Reminder):
-        """Send SMS notification for a specific reminder"""
+    def _send_reminder_notification(self, reminder: Reminder):
+        """Send SMS notification for a specific reminder, using a session of its own"""
+        db = SessionLocal()
         try:
             # Check if SMS service is configured
             if not sms_service.is_configured():
@@ -169,7 +184,7 @@ class ReminderScheduler:
                 return
             
             # Get patient information
-            patient = db.query(Patient).filter(Patient.patient_id == reminder.patient_id).first()
+            patient = db.get(Patient, reminder.patient_id)
             if not patient:
                 logger.error(f"Patient not found for reminder {reminder.reminder_id}")
                 return
@@ -184,6 +199,8 @@ class ReminderScheduler:
             
         except Exception as e:
             logger.error(f"Error sending reminder notification: {str(e)}")
+        finally:
+            db.close()
     
     def send_immediate_reminder(self, db: Session, reminder_id: str) -> Dict[str, Any]:
         """
@@ -244,20 +261,15 @@ class ReminderScheduler:
             current_time = datetime.utcnow()
             upcoming = []
             
-            # Get all active reminders
-            active_reminders = db.query(Reminder).filter(
+            # Get all active reminders with their patient in one query; the inner join
+            # skips reminders whose patient no longer exists
+            active_reminders = db.query(Reminder, Patient).join(
+                Patient, Patient.patient_id == Reminder.patient_id
+            ).filter(
                 Reminder.status == "active"
             ).all()
             
-            for reminder in active_reminders:
-                # Get patient info
-                patient = db.query(Patient).filter(
-                    Patient.patient_id == reminder.patient_id
-                ).first()
-                
-                if not patient:
-                    continue
-                
+            for reminder, patient in active_reminders:
                 # Check each scheduled time
                 for scheduled_time in reminder.scheduled_time:
                     # Calculate next occurrence
@@ -16,7 +16,7 @@ class ReminderService:
         Create a new reminder for a patient
         """
         # Verify patient exists
-        patient = db.query(Patient).filter(Patient.patient_id == reminder_data.patient_id).first()
+        patient = db.get(Patient, reminder_data.patient_id)
         if not patient:
             raise ValueError("Patient not found")
         
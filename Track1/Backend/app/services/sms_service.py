@@ -116,7 +116,7 @@ class SMSService:
                     'reminder_id': reminder_id
                 }
             
-            patient = db.query(Patient).filter(Patient.patient_id == reminder.patient_id).first()
+            patient = db.get(Patient, reminder.patient_id)
             if not patient:
                 return {
                     'success': False,
@@ -0,0 +1,82 @@
+import os
+import uuid
+from datetime import datetime
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.api import patient
+from app.db.database import Base, get_db
+from app.models.models import Patient
+
+PATIENT_COUNT = 25
+
+@pytest.fixture
+def client():
+    # Only the patients table: the other tables use PostgreSQL-only column types
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine, tables=[Patient.__table__])
+    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    
+    db = TestingSessionLocal()
+    db.add_all([
+        Patient(
+            patient_id=uuid.uuid4(),
+            full_name=f"Patient {i}",
+            phone_number=f"+23760000{i:04d}",
+            preferred_language="en",
+            created_at=datetime(2024, 1, 1),
+            password_hash="not-a-real-hash"
+        )
+        for i in range(PATIENT_COUNT)
+    ])
+    db.commit()
+    db.close()
+    
+    def override_get_db():
+        db = TestingSessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+    
+    app = FastAPI()
+    app.include_router(patient.router, prefix="/api")
+    app.dependency_overrides[get_db] = override_get_db
+    yield TestClient(app)
+    engine.dispose()
+
+def test_after_id_pages_cover_every_patient_once(client):
+    """Paging with after_id returns each patient exactly once, in patient_id order"""
+    seen = []
+    after_id = None
+    while True:
+        params = {"limit": 7}
+        if after_id:
+            params["after_id"] = after_id
+        response = client.get("/api/patient/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        if not page:
+            break
+        seen.extend(p["patient_id"] for p in page)
+        after_id = page[-1]["patient_id"]
+    
+    assert len(seen) == PATIENT_COUNT
+    assert len(set(seen)) == PATIENT_COUNT
+    assert seen == sorted(seen)
+
+def test_list_patients_matches_response_model(client):
+    """Each listed patient has exactly the Patient schema fields and no password hash"""
+    response = client.get("/api/patient/", params={"limit": 1})
+    
+    assert response.status_code == 200
+    assert set(response.json()[0]) == {
+        "patient_id", "full_name", "phone_number", "email", "preferred_language", "created_at"
+    }
@@ -1,25 +1,37 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from fastapi import APIRouter, Body, Depends, HTTPException, status, Query, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, timedelta
 import pandas as pd
 import io
+import csv
+import itertools
+import uuid
 import numpy as np
 from scipy import stats
 
 from app.db.database import get_db
 from app.core.auth import get_current_user, require_permission
+from app.core.constants import BLOOD_GROUPS
 from app.models.user import User
 from app.schemas.blood_bank import (
     BloodCollectionCreate, BloodCollectionUpdate, BloodCollectionResponse,
     BloodUsageCreate, BloodUsageUpdate, BloodUsageResponse,
-    BloodInventorySummary, InventoryAlert, DHIS2SyncRequest, DHIS2SyncResponse
+    BloodInventorySummary, InventoryAlert, DHIS2SyncRequest, DHIS2SyncResponse,
+    BLOOD_TYPE_VALUES, GENDER_VALUES
 )
 from app.services.blood_bank_service import BloodBankService
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Rows read from an uploaded CSV per bulk write
+CSV_BATCH_SIZE = 1000
+
+# Columns a CSV row must have a value for before it is validated further
+COLLECTION_CRITICAL_COLUMNS = ('blood_type', 'donor_gender', 'donor_age')
+USAGE_CRITICAL_COLUMNS = ('blood_group', 'volume_given_out', 'purpose', 'department')
+
 router = APIRouter(prefix="/blood-bank")
 
 # ==================== COLLECTION ENDPOINTS ====================
@@ -46,6 +58,33 @@ def create_collection(
             detail=f"Failed to create collection: {str(e)}"
         )
 
+@router.post("/collections/batch", status_code=status.HTTP_201_CREATED)
+def create_collections_batch(
+    collections: List[BloodCollectionCreate] = Body(..., min_length=1, max_length=5000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_permission("can_manage_donors"))
+):
+    """
+    Create many blood collection records in one request
+    
+    All records are written in a single transaction and stock is updated once per blood type.
+    
+    Requires: can_manage_donors permission
+    """
+    try:
+        service = BloodBankService(db)
+        created = service.create_collections_bulk(collections, current_user.user_id)
+        return {
+            "message": "Batch collection upload completed",
+            "successful_uploads": created
+        }
+    except Exception as e:
+        logger.error(f"Error creating collection batch: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Failed to create collections: {str(e)}"
+        )
+
 @router.get("/collections", response_model=List[BloodCollectionResponse])
 def get_collections(
     blood_type: Optional[str] = Query(None, description="Filter by blood type (A+, A-, B+, B-, AB+, AB-, O+, O-)"),
@@ -53,6 +92,7 @@ def get_collections(
     collection_date_to: Optional[datetime] = Query(None, description="Filter collections up to this date"),
     limit: int = Query(100, ge=1, le=1000, description="Maximum number of records to return"),
     offset: int = Query(0, ge=0, description="Number of records to skip"),
+    after_id: Optional[uuid.UUID] = Query(None, description="Return records after this donation_record_id (last id of the previous page)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_permission("can_view_analytics"))
 ):
@@ -67,7 +107,8 @@ def get_collections(
         collection_date_from=collection_date_from,
         collection_date_to=collection_date_to,
         limit=limit,
-        offset=offset
+        offset=offset,
+        after_id=after_id
     )
     return collections
 
@@ -106,9 +147,10 @@ def get_usage_records(
     blood_group: Optional[str] = Query(None, description="Filter by blood group"),
     usage_date_from: Optional[datetime] = Query(None, description="Filter usage from this date"),
     usage_date_to: Optional[datetime] = Query(None, description="Filter usage up to this date"),
-    patient_location: Optional[str] = Query(None, description="Filter by patient location"),
+    patient_location: Optional[str] = Query(None, min_length=3, description="Filter by patient location (at least 3 characters)"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    after_id: Optional[uuid.UUID] = Query(None, description="Return records after this usage_id (last id of the previous page)"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_permission("can_access_reports"))
 ):
@@ -124,7 +166,8 @@ def get_usage_records(
         usage_date_to=usage_date_to,
         patient_location=patient_location,
         limit=limit,
-        offset=offset
+        offset=offset,
+        after_id=after_id
     )
     return usage_records
 
@@ -243,34 +286,20 @@ def get_system_status(
     Requires: Any authenticated user
     """
     try:
-        # Get basic statistics using new models
-        from app.models.blood_collection import BloodCollection
-        from app.models.blood_usage import BloodUsage
-        from app.models.blood_stock import BloodStock
-        
-        total_collections = db.query(BloodCollection).count()
-        total_usage_records = db.query(BloodUsage).count()
-        total_stock_records = db.query(BloodStock).count()
-        
-        # Get recent activity (last 24 hours)
+        # Get basic statistics and recent activity (last 24 hours) in one query
         yesterday = datetime.utcnow() - timedelta(hours=24)
-        recent_collections = db.query(BloodCollection).filter(
-            BloodCollection.created_at >= yesterday
-        ).count()
-        recent_usage = db.query(BloodUsage).filter(
-            BloodUsage.created_at >= yesterday
-        ).count()
+        counts = BloodBankService(db).get_activity_counts(yesterday)
         
         return {
             "status": "operational",
             "timestamp": datetime.utcnow(),
             "database_connected": True,
             "statistics": {
-                "total_collections": total_collections,
-                "total_usage_records": total_usage_records,
-                "total_stock_records": total_stock_records,
-                "recent_collections_24h": recent_collections,
-                "recent_usage_24h": recent_usage
+                "total_collections": counts["total_collections"],
+                "total_usage_records": counts["total_usage_records"],
+                "total_stock_records": counts["total_stock_records"],
+                "recent_collections_24h": counts["recent_collections"],
+                "recent_usage_24h": counts["recent_usage"]
             },
             "user_permissions": {
                 "can_manage_inventory": current_user.can_manage_inventory,
@@ -318,7 +347,15 @@ def get_daily_volume_trends(
         
         # All blood types if not specified
         if not blood_types:
-            blood_types = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+            blood_types = BLOOD_GROUPS
+        
+        # Date series shared by every blood type
+        date_series = []
+        current_date = start_date
+        while current_date <= end_date:
+            date_series.append(current_date)
+            current_date += timedelta(days=1)
+        iso_dates = [date.isoformat() for date in date_series]
         
         trends_data = {}
         
@@ -353,13 +390,6 @@ def get_daily_volume_trends(
                 BloodStock.stock_date <= end_date
             ).group_by(func.date(BloodStock.stock_date)).all()
             
-            # Create date series
-            date_series = []
-            current_date = start_date
-            while current_date <= end_date:
-                date_series.append(current_date)
-                current_date += timedelta(days=1)
-            
             # Convert to dictionaries for easy lookup
             donations_dict = {d.date: float(d.donated_volume or 0) for d in daily_donations}
             usage_dict = {d.date: float(d.used_volume or 0) for d in daily_usage}
@@ -367,7 +397,7 @@ def get_daily_volume_trends(
             
             # Build trend data
             trends_data[blood_type] = {
-                "dates": [date.isoformat() for date in date_series],
+                "dates": iso_dates,
                 "donated_volume": [donations_dict.get(date, 0) for date in date_series],
                 "used_volume": [usage_dict.get(date, 0) for date in date_series],
                 "stock_volume": [stock_dict.get(date, 0) for date in date_series]
@@ -570,7 +600,6 @@ def get_inventory_optimization(
     try:
         from app.models.blood_collection import BloodCollection
         from app.models.blood_usage import BloodUsage
-        from app.models.blood_stock import BloodStock
         from sqlalchemy import func
         
         # Get data for the last 90 days for better forecasting
@@ -578,7 +607,7 @@ def get_inventory_optimization(
         start_date = end_date - timedelta(days=90)
         
         # Get all blood types
-        blood_types = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+        blood_types = BLOOD_GROUPS
         
         # Get historical usage data (for demand forecasting)
         usage_data = db.query(
@@ -593,13 +622,11 @@ def get_inventory_optimization(
             func.date(BloodUsage.usage_date)
         ).all()
         
-        # Get current stock levels
-        current_stock = {}
-        for blood_type in blood_types:
-            stock_record = db.query(BloodStock).filter(
-                BloodStock.blood_group == blood_type
-            ).order_by(BloodStock.stock_date.desc()).first()
-            current_stock[blood_type] = stock_record.total_available if stock_record else 0
+        # Get current stock levels for all blood types in one query
+        current_stock = {
+            inventory["blood_group"]: inventory["total_available"]
+            for inventory in BloodBankService(db).get_current_inventory()
+        }
         
         # Convert usage data to DataFrame for analysis
         if not usage_data:
@@ -615,16 +642,16 @@ def get_inventory_optimization(
                 for record in usage_data
             ])
         
+        # Split usage per blood type once; both the forecast and safety stock loops read it
+        empty_usage = pd.DataFrame(columns=['blood_type', 'date', 'daily_usage'])
+        usage_by_type = dict(tuple(usage_df.groupby('blood_type'))) if len(usage_df) > 0 else {}
+        
         # Calculate forecasted demand for each blood type
         forecasted_demand = {}
         usage_statistics = {}
         
         for blood_type in blood_types:
-            # Handle empty DataFrame gracefully
-            if len(usage_df) > 0 and 'blood_type' in usage_df.columns:
-                bt_usage = usage_df[usage_df['blood_type'] == blood_type]
-            else:
-                bt_usage = pd.DataFrame(columns=['blood_type', 'date', 'daily_usage'])
+            bt_usage = usage_by_type.get(blood_type, empty_usage)
             
             if len(bt_usage) > 0:
                 # Simple moving average forecast with trend adjustment
@@ -663,11 +690,7 @@ def get_inventory_optimization(
         
         safety_stock = {}
         for blood_type in blood_types:
-            # Handle empty DataFrame gracefully
-            if len(usage_df) > 0 and 'blood_type' in usage_df.columns:
-                bt_usage = usage_df[usage_df['blood_type'] == blood_type]
-            else:
-                bt_usage = pd.DataFrame(columns=['blood_type', 'date', 'daily_usage'])
+            bt_usage = usage_by_type.get(blood_type, empty_usage)
             
             if len(bt_usage) > 7:  # Need sufficient data for variability calculation
                 # Calculate standard deviation of daily demand
@@ -737,8 +760,11 @@ def get_inventory_optimization(
 
 # ==================== CSV UPLOAD ENDPOINTS ====================
 
+# Plain def: the uploads read the file and write batches through the sync Session,
+# so FastAPI runs them in its threadpool rather than blocking the event loop
+
 @router.post("/collections/upload-csv", status_code=status.HTTP_201_CREATED)
-async def upload_collections_csv(
+def upload_collections_csv(
     file: UploadFile = File(..., description="CSV file with blood collection data"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_permission("can_manage_donors"))
@@ -767,9 +793,14 @@ async def upload_collections_csv(
                 detail="File must be a CSV file"
             )
         
-        # Read CSV content
-        content = await file.read()
-        df = pd.read_csv(io.StringIO(content.decode('utf-8')))
+        # Stream rows from the uploaded file instead of loading it into a DataFrame;
+        # utf-8-sig drops the byte order mark Excel writes, so the first header matches
+        reader = csv.DictReader(io.TextIOWrapper(file.file, encoding='utf-8-sig', newline=''))
+        if not reader.fieldnames:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="CSV file is empty"
+            )
         
         # Validate required columns
         required_columns = [
@@ -777,7 +808,7 @@ async def upload_collections_csv(
             'donation_date', 'expiry_date', 'collection_volume_ml', 'hemoglobin_g_dl'
         ]
         
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in required_columns if col not in reader.fieldnames]
         if missing_columns:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -786,53 +817,80 @@ async def upload_collections_csv(
         
         # Clean and validate data
         service = BloodBankService(db)
+        total_records = 0
         successful_uploads = 0
         failed_uploads = []
         
-        logger.info(f"Processing {len(df)} collection records from CSV")
-        
-        for index, row in df.iterrows():
+        while batch := list(itertools.islice(reader, CSV_BATCH_SIZE)):
+            valid_collections = []
+            
+            for row_number, row in enumerate(batch, start=total_records + 1):
+                try:
+                    # Skip rows with missing critical data
+                    if any(not row[column] for column in COLLECTION_CRITICAL_COLUMNS):
+                        failed_uploads.append(f"Row {row_number}: Missing critical data")
+                        continue
+                    
+                    # Reject unknown codes before building the model
+                    donor_gender = row['donor_gender'].strip().upper()
+                    blood_type = row['blood_type'].strip()
+                    if blood_type not in BLOOD_TYPE_VALUES:
+                        failed_uploads.append(f"Row {row_number}: Invalid blood type '{blood_type}'")
+                        continue
+                    if donor_gender not in GENDER_VALUES:
+                        failed_uploads.append(f"Row {row_number}: Invalid donor gender '{donor_gender}'")
+                        continue
+                    
+                    # Create collection data
+                    collection_data = BloodCollectionCreate(
+                        donor_age=int(float(row['donor_age'])),
+                        donor_gender=donor_gender,
+                        donor_occupation=row.get('donor_occupation') or 'Unknown',
+                        blood_type=blood_type,
+                        collection_site=row['collection_site'],
+                        donation_date=pd.to_datetime(row['donation_date']).date(),
+                        expiry_date=pd.to_datetime(row['expiry_date']).date(),
+                        collection_volume_ml=float(row['collection_volume_ml']),
+                        hemoglobin_g_dl=float(row['hemoglobin_g_dl'])
+                    )
+                    valid_collections.append((row_number, collection_data))
+                    
+                except Exception as e:
+                    failed_uploads.append(f"Row {row_number}: {str(e)}")
+            
+            total_records += len(batch)
+            
+            # Load each batch of valid rows in a single bulk operation
             try:
-                # Skip rows with missing critical data
-                if pd.isna(row['donor_age']) or pd.isna(row['donor_gender']) or pd.isna(row['blood_type']):
-                    failed_uploads.append(f"Row {index + 1}: Missing critical data")
-                    continue
-                
-                # Create collection data
-                collection_data = BloodCollectionCreate(
-                    donor_age=int(row['donor_age']),
-                    donor_gender=str(row['donor_gender']).upper(),
-                    donor_occupation=str(row.get('donor_occupation', 'Unknown')),
-                    blood_type=str(row['blood_type']),
-                    collection_site=str(row['collection_site']),
-                    donation_date=pd.to_datetime(row['donation_date']).date(),
-                    expiry_date=pd.to_datetime(row['expiry_date']).date(),
-                    collection_volume_ml=float(row['collection_volume_ml']),
-                    hemoglobin_g_dl=float(row['hemoglobin_g_dl'])
+                successful_uploads += service.create_collections_bulk(
+                    [collection_data for _, collection_data in valid_collections], current_user.user_id
                 )
-                
-                # Create collection record
-                collection = service.create_collection(collection_data, current_user.user_id)
-                successful_uploads += 1
-                
-            except Exception as e:
-                failed_uploads.append(f"Row {index + 1}: {str(e)}")
+                continue
+            except ValueError:
+                pass
+            
+            # Otherwise record rows one at a time so only the rows that cannot be stored fail
+            for row_number, collection_data in valid_collections:
+                try:
+                    service.create_collection(collection_data, current_user.user_id)
+                    successful_uploads += 1
+                except Exception as e:
+                    failed_uploads.append(f"Row {row_number}: {str(e)}")
+        
+        logger.info(f"Processed {total_records} collection records from CSV")
         
         return {
             "message": f"CSV upload completed",
-            "total_records": len(df),
+            "total_records": total_records,
             "successful_uploads": successful_uploads,
             "failed_uploads": len(failed_uploads),
             "failures": failed_uploads[:10],  # Show first 10 failures
             "has_more_failures": len(failed_uploads) > 10
         }
         
-    except pd.errors.EmptyDataError:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="CSV file is empty"
-        )
-    except pd.errors.ParserError as e:
+    except HTTPException:
+        raise
+    except (csv.Error, UnicodeDecodeError) as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Error parsing CSV file: {str(e)}"
@@ -845,7 +903,7 @@ async def upload_collections_csv(
         )
 
 @router.post("/usage/upload-csv", status_code=status.HTTP_201_CREATED)
-async def upload_usage_csv(
+def upload_usage_csv(
     file: UploadFile = File(..., description="CSV file with blood usage data"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_permission("can_manage_inventory"))
@@ -872,9 +930,14 @@ async def upload_usage_csv(
                 detail="File must be a CSV file"
             )
         
-        # Read CSV content
-        content = await file.read()
-        df = pd.read_csv(io.StringIO(content.decode('utf-8')))
+        # Stream rows from the uploaded file instead of loading it into a DataFrame;
+        # utf-8-sig drops the byte order mark Excel writes, so the first header matches
+        reader = csv.DictReader(io.TextIOWrapper(file.file, encoding='utf-8-sig', newline=''))
+        if not reader.fieldnames:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="CSV file is empty"
+            )
         
         # Validate required columns
         required_columns = [
@@ -882,7 +945,7 @@ async def upload_usage_csv(
             'usage_date', 'patient_location'
         ]
         
-        missing_columns = [col for col in required_columns if col not in df.columns]
+        missing_columns = [col for col in required_columns if col not in reader.fieldnames]
         if missing_columns:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -891,52 +954,74 @@ async def upload_usage_csv(
         
         # Clean and validate data
         service = BloodBankService(db)
+        total_records = 0
         successful_uploads = 0
         failed_uploads = []
         
-        logger.info(f"Processing {len(df)} usage records from CSV")
-        
-        for index, row in df.iterrows():
+        while batch := list(itertools.islice(reader, CSV_BATCH_SIZE)):
+            valid_usages = []
+            
+            for row_number, row in enumerate(batch, start=total_records + 1):
+                try:
+                    # Skip rows with missing critical data
+                    if any(not row[column] for column in USAGE_CRITICAL_COLUMNS):
+                        failed_uploads.append(f"Row {row_number}: Missing critical data")
+                        continue
+                    
+                    # Reject unknown codes before building the model
+                    blood_group = row['blood_group'].strip()
+                    if blood_group not in BLOOD_TYPE_VALUES:
+                        failed_uploads.append(f"Row {row_number}: Invalid blood group '{blood_group}'")
+                        continue
+                    
+                    # Create usage data
+                    usage_data = BloodUsageCreate(
+                        purpose=row['purpose'],
+                        department=row['department'],
+                        blood_group=blood_group,
+                        volume_given_out=float(row['volume_given_out']),
+                        usage_date=pd.to_datetime(row['usage_date']).date(),
+                        individual_name=row.get('individual_name') or 'Unknown Patient',
+                        patient_location=row['patient_location']
+                    )
+                    valid_usages.append((row_number, usage_data))
+                    
+                except Exception as e:
+                    failed_uploads.append(f"Row {row_number}: {str(e)}")
+            
+            total_records += len(batch)
+            
+            # Load each batch in a single bulk operation when stock covers all of it
             try:
-                # Skip rows with missing critical data
-                if (pd.isna(row['purpose']) or pd.isna(row['department']) or 
-                    pd.isna(row['blood_group']) or pd.isna(row['volume_given_out'])):
-                    failed_uploads.append(f"Row {index + 1}: Missing critical data")
-                    continue
-                
-                # Create usage data
-                usage_data = BloodUsageCreate(
-                    purpose=str(row['purpose']),
-                    department=str(row['department']),
-                    blood_group=str(row['blood_group']),
-                    volume_given_out=float(row['volume_given_out']),
-                    usage_date=pd.to_datetime(row['usage_date']).date(),
-                    individual_name=str(row.get('individual_name', 'Unknown Patient')),
-                    patient_location=str(row['patient_location'])
+                successful_uploads += service.create_usage_bulk(
+                    [usage_data for _, usage_data in valid_usages], current_user.user_id
                 )
-                
-                # Create usage record
-                usage = service.create_usage(usage_data, current_user.user_id)
-                successful_uploads += 1
-                
-            except Exception as e:
-                failed_uploads.append(f"Row {index + 1}: {str(e)}")
+                continue
+            except ValueError:
+                pass
+            
+            # Otherwise record rows one at a time so only the ones stock cannot cover fail
+            for row_number, usage_data in valid_usages:
+                try:
+                    service.create_usage(usage_data, current_user.user_id)
+                    successful_uploads += 1
+                except Exception as e:
+                    failed_uploads.append(f"Row {row_number}: {str(e)}")
+        
+        logger.info(f"Processed {total_records} usage records from CSV")
         
         return {
             "message": f"CSV upload completed",
-            "total_records": len(df),
+            "total_records": total_records,
             "successful_uploads": successful_uploads,
             "failed_uploads": len(failed_uploads),
             "failures": failed_uploads[:10],  # Show first 10 failures
             "has_more_failures": len(failed_uploads) > 10
         }
         
-    except pd.errors.EmptyDataError:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="CSV file is empty"
-        )
-    except pd.errors.ParserError as e:
+    except HTTPException:
+        raise
+    except (csv.Error, UnicodeDecodeError) as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Error parsing CSV file: {str(e)}"
@@ -0,0 +1,12 @@
+# Domain constants shared by models, services and scripts
+
+# Supported ABO/Rh blood groups
+BLOOD_GROUPS = ("A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-")
+
+# Donor gender codes
+DONOR_GENDERS = ("M", "F")
+
+
+def sql_in_list(values) -> str:
+    """Render string constants as a SQL IN list body, e.g. 'A+', 'A-'"""
+    return ", ".join(f"'{value}'" for value in values)
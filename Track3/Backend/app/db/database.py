@@ -10,11 +10,15 @@ engine = create_engine(
     pool_pre_ping=True,
     pool_size=10,
     max_overflow=20,
+    pool_recycle=1800,  # replace connections before server/proxy idle timeouts drop them
     echo=settings.DEBUG  # Enable SQL logging in debug mode
 )
 
 # Create SessionLocal class
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: objects returned after commit are serialized as-is instead of
+# being reloaded with one SELECT each; server defaults come back with the INSERT (eager_defaults).
+# Columns the database rewrites on UPDATE are declared server_onupdate so the ORM re-fetches them
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 
 # Create Base class for models
 Base = declarative_base()
@@ -0,0 +1,44 @@
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ts_ms = 0
+_counter = 0
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Generate a time-ordered UUID (RFC 9562 version 7)
+    
+    The leading 48 bits hold the Unix timestamp in milliseconds, so new keys
+    land at the right edge of the primary key B-tree instead of at random pages.
+    rand_a is a 12-bit counter (RFC 9562 method 1): it starts at a random value
+    each millisecond and increments within it, so ids from this process are
+    strictly increasing.
+    """
+    global _last_ts_ms, _counter
+    
+    with _lock:
+        unix_ts_ms = time.time_ns() // 1_000_000
+        if unix_ts_ms > _last_ts_ms:
+            _last_ts_ms = unix_ts_ms
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x7FF  # leave headroom before overflow
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # Counter exhausted within one millisecond: borrow the next one
+                _last_ts_ms += 1
+                _counter = 0
+        unix_ts_ms = _last_ts_ms
+        counter = _counter
+    
+    rand_b = int.from_bytes(os.urandom(8), "big")
+    
+    value = (unix_ts_ms & 0xFFFF_FFFF_FFFF) << 80   # unix_ts_ms (48 bits)
+    value |= 0x7 << 76                              # version
+    value |= counter << 64                          # rand_a: counter (12 bits)
+    value |= 0b10 << 62                             # variant
+    value |= rand_b & ((1 << 62) - 1)               # rand_b (62 bits)
+    return uuid.UUID(int=value)
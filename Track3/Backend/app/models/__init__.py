@@ -5,5 +5,6 @@ from .user import User
 from .blood_collection import BloodCollection
 from .blood_usage import BloodUsage
 from .blood_stock import BloodStock
+from . import audit_triggers
 
 __all__ = ["User", "BloodCollection", "BloodUsage", "BloodStock"]
\ No newline at end of file
@@ -0,0 +1,27 @@
+from sqlalchemy import DDL, event
+from app.db.database import Base
+from .blood_collection import BloodCollection
+from .blood_usage import BloodUsage
+from .blood_stock import BloodStock
+
+# updated_at is maintained by the database (PostgreSQL only) instead of an ORM
+# onupdate default, so bulk and Core UPDATEs stamp it without extra parameters
+create_set_updated_at_function = DDL("""
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at = now();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql
+""")
+
+event.listen(Base.metadata, "before_create", create_set_updated_at_function.execute_if(dialect="postgresql"))
+
+for model in (BloodCollection, BloodUsage, BloodStock):
+    table_name = model.__tablename__
+    create_trigger = DDL(
+        f"CREATE TRIGGER trg_{table_name}_updated_at "
+        f"BEFORE UPDATE ON {table_name} "
+        f"FOR EACH ROW EXECUTE FUNCTION set_updated_at()"
+    )
+    event.listen(model.__table__, "after_create", create_trigger.execute_if(dialect="postgresql"))
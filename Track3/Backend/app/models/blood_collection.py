@@ -1,16 +1,17 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, ForeignKey, Index, CheckConstraint, FetchedValue
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
 from app.db.database import Base
+from app.db.ids import uuid7
+from app.core.constants import BLOOD_GROUPS, DONOR_GENDERS, sql_in_list
 
 class BloodCollection(Base):
     """Blood donation/collection records"""
     __tablename__ = "blood_collections"
     
     # Primary key - UUID as specified
-    donation_record_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    donation_record_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     
     # Donor information
     donor_age = Column(Integer, nullable=False)
@@ -18,11 +19,11 @@ class BloodCollection(Base):
     donor_occupation = Column(String(100))
     
     # Blood information - using blood_type as specified
-    blood_type = Column(String(10), nullable=False, index=True)  # A+, A-, B+, B-, AB+, AB-, O+, O-
+    blood_type = Column(String(10), nullable=False)  # A+, A-, B+, B-, AB+, AB-, O+, O-
     collection_site = Column(String(200), nullable=False)
     
     # Collection details - changed to Date only (no time)
-    donation_date = Column(Date, nullable=False, index=True)
+    donation_date = Column(Date, nullable=False)
     expiry_date = Column(Date, nullable=False)
     collection_volume_ml = Column(Float, nullable=False)
     hemoglobin_g_dl = Column(Float, nullable=False)
@@ -32,11 +33,37 @@ class BloodCollection(Base):
     
     # Audit timestamps (keep datetime for audit purposes)
     created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue())  # maintained by trigger on PostgreSQL
     
     # Relationships
     stock_entries = relationship("BloodStock", back_populates="collection")
-    created_by_user = relationship("User", foreign_keys=[created_by])
+    created_by_user = relationship("User", foreign_keys=[created_by], back_populates="collections_created")
+    
+    # Indexes for performance
+    __table_args__ = (
+        # Rows arrive roughly in date order, so a BRIN index serves date-range scans at a fraction of a B-tree's size
+        Index('idx_blood_collections_donation_date_brin', 'donation_date', postgresql_using='brin'),
+        # Per-group expiry totals (recomputed on every stock write) read only this index;
+        # blood_type-only lookups use its leading column
+        Index(
+            'idx_blood_collections_blood_type_expiry',
+            'blood_type',
+            'expiry_date',
+            postgresql_include=['collection_volume_ml'],
+        ),
+        # Expiry alerts read a short date window; INCLUDE turns them into index-only scans
+        Index(
+            'idx_blood_collections_expiry_date',
+            'expiry_date',
+            postgresql_include=['blood_type', 'collection_volume_ml', 'donation_record_id'],
+        ),
+        # Only valid codes reach the table, whichever path wrote the row
+        CheckConstraint(f"blood_type IN ({sql_in_list(BLOOD_GROUPS)})", name='ck_blood_collections_blood_type'),
+        CheckConstraint(f"donor_gender IN ({sql_in_list(DONOR_GENDERS)})", name='ck_blood_collections_donor_gender'),
+    )
+    
+    # Fetch created_at/updated_at in the INSERT itself (RETURNING) so the record is complete after commit
+    __mapper_args__ = {"eager_defaults": True}
     
     def __repr__(self):
         return f"<BloodCollection(id={self.donation_record_id}, blood_type={self.blood_type}, volume={self.collection_volume_ml}ml)>"
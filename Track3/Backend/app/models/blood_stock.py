@@ -1,19 +1,20 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, ForeignKey, Index, CheckConstraint, FetchedValue
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
 from app.db.database import Base
+from app.db.ids import uuid7
+from app.core.constants import BLOOD_GROUPS, sql_in_list
 
 class BloodStock(Base):
     """Blood stock tracking with audit trail - Total volume table"""
     __tablename__ = "blood_stock"
     
     # Primary key - UUID as specified (only one primary key needed)
-    stock_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    stock_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     
     # Blood information
-    blood_group = Column(String(10), nullable=False, index=True)  # A+, A-, B+, B-, AB+, AB-, O+, O-
+    blood_group = Column(String(10), nullable=False)  # A+, A-, B+, B-, AB+, AB-, O+, O-
     
     # Stock volumes
     total_available = Column(Float, nullable=False, default=0.0)  # current total volume available
@@ -29,7 +30,7 @@ class BloodStock(Base):
     
     # Audit timestamps (keep datetime for audit purposes)
     created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue())  # maintained by trigger on PostgreSQL
     
     # Relationships
     collection = relationship("BloodCollection", back_populates="stock_entries")
@@ -37,9 +38,19 @@ class BloodStock(Base):
     
     # Indexes for performance
     __table_args__ = (
-        Index('idx_blood_stock_blood_group_date', 'blood_group', 'stock_date'),
+        # One row per blood group per day, latest first; INCLUDE lets current-stock reads
+        # run as index-only scans. Also serves blood_group-only lookups (leading column)
+        Index(
+            'idx_blood_stock_blood_group_date',
+            'blood_group',
+            text('stock_date DESC'),
+            unique=True,
+            postgresql_include=['total_available', 'total_near_expiry', 'total_expired', 'updated_at'],
+        ),
         Index('idx_blood_stock_donation_ref', 'donation_record_id'),
         Index('idx_blood_stock_usage_ref', 'usage_record_id'),
+        CheckConstraint(f"blood_group IN ({sql_in_list(BLOOD_GROUPS)})", name='ck_blood_stock_blood_group'),
+        CheckConstraint("total_available >= 0", name='ck_blood_stock_total_available_non_negative'),
     )
     
     def __repr__(self):
@@ -1,27 +1,28 @@
-from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, ForeignKey, Index
+from sqlalchemy import Column, Integer, String, Float, Date, DateTime, Text, ForeignKey, Index, CheckConstraint, FetchedValue, DDL, event
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from sqlalchemy.dialects.postgresql import UUID
-import uuid
 from app.db.database import Base
+from app.db.ids import uuid7
+from app.core.constants import BLOOD_GROUPS, sql_in_list
 
 class BloodUsage(Base):
     """Blood usage/distribution records"""
     __tablename__ = "blood_usage"
     
     # Primary key - UUID as specified
-    usage_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    usage_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     
     # Transaction details - moved from blood_stock as requested
     purpose = Column(String(50), nullable=False)  # 'transfusion', 'emergency', 'surgery', 'transfer'
     department = Column(String(100), nullable=False)
     
     # Blood information
-    blood_group = Column(String(10), nullable=False, index=True)  # A+, A-, B+, B-, AB+, AB-, O+, O-
+    blood_group = Column(String(10), nullable=False)  # A+, A-, B+, B-, AB+, AB-, O+, O-
     volume_given_out = Column(Float, nullable=False)  # renamed as specified
     
     # Date - date only (no time except for audit columns)
-    usage_date = Column(Date, nullable=False, index=True, server_default=func.current_date())
+    usage_date = Column(Date, nullable=False, server_default=func.current_date())
     
     # Patient/recipient information
     individual_name = Column(String(200), nullable=False)  # name of individual blood was given to
@@ -32,11 +33,43 @@ class BloodUsage(Base):
     
     # Audit timestamps (keep datetime for audit purposes)
     created_at = Column(DateTime, server_default=func.now())
-    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+    updated_at = Column(DateTime, server_default=func.now(), server_onupdate=FetchedValue())  # maintained by trigger on PostgreSQL
     
     # Relationships
     stock_entries = relationship("BloodStock", back_populates="usage")
-    processed_by_user = relationship("User", foreign_keys=[processed_by])
+    processed_by_user = relationship("User", foreign_keys=[processed_by], back_populates="usage_processed")
+    
+    # Indexes for performance
+    __table_args__ = (
+        # Covering index for per-group usage over a date range (index-only scans on PostgreSQL)
+        Index(
+            'idx_blood_usage_blood_group_date',
+            'blood_group',
+            text('usage_date DESC'),
+            postgresql_include=['volume_given_out'],
+        ),
+        # Usage is recorded close to its usage_date, so a small BRIN index covers date-range filters
+        Index('idx_blood_usage_usage_date_brin', 'usage_date', postgresql_using='brin'),
+        # Trigram index so substring searches on patient location avoid a sequential scan
+        Index(
+            'idx_blood_usage_patient_location_trgm',
+            'patient_location',
+            postgresql_using='gin',
+            postgresql_ops={'patient_location': 'gin_trgm_ops'},
+        ),
+        CheckConstraint(f"blood_group IN ({sql_in_list(BLOOD_GROUPS)})", name='ck_blood_usage_blood_group'),
+    )
+    
+    # Fetch created_at/updated_at in the INSERT itself (RETURNING) so the record is complete after commit
+    __mapper_args__ = {"eager_defaults": True}
     
     def __repr__(self):
         return f"<BloodUsage(id={self.usage_id}, blood_group={self.blood_group}, volume={self.volume_given_out}ml)>"
+
+
+# gin_trgm_ops is provided by the pg_trgm extension
+event.listen(
+    BloodUsage.__table__,
+    "before_create",
+    DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql")
+)
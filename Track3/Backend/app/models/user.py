@@ -1,5 +1,6 @@
 import uuid
 from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
 from app.core.security import SecurityUtils
@@ -8,7 +9,7 @@ from sqlalchemy.dialects.postgresql import UUID
 class User(Base):
     __tablename__ = "users"
     
-    user_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4, index=True)
+    user_id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     username = Column(String(50), unique=True, index=True, nullable=False)
     phone = Column(String(20))
     email = Column(String(100), unique=True, index=True, nullable=False)
@@ -37,6 +38,14 @@ class User(Base):
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
     created_by = Column(Integer)
     
+    # Relationships
+    collections_created = relationship(
+        "BloodCollection", foreign_keys="BloodCollection.created_by", back_populates="created_by_user"
+    )
+    usage_processed = relationship(
+        "BloodUsage", foreign_keys="BloodUsage.processed_by", back_populates="processed_by_user"
+    )
+    
     def __repr__(self):
         return f"<User(username={self.username}, role={self.role})>"
     
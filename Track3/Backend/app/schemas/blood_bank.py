@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime, date
 from typing import Optional, List, Union
 from enum import Enum
@@ -19,6 +19,10 @@ class Gender(str, Enum):
     MALE = "M"
     FEMALE = "F"
 
+# Valid enum values, built once for cheap membership checks on bulk imports
+BLOOD_TYPE_VALUES = frozenset(blood_type.value for blood_type in BloodType)
+GENDER_VALUES = frozenset(gender.value for gender in Gender)
+
 # ==================== BLOOD COLLECTION SCHEMAS ====================
 
 class BloodCollectionBase(BaseModel):
@@ -53,8 +57,7 @@ class BloodCollectionResponse(BloodCollectionBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ==================== BLOOD USAGE SCHEMAS ====================
 
@@ -84,8 +87,7 @@ class BloodUsageResponse(BloodUsageBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ==================== BLOOD STOCK SCHEMAS ====================
 
@@ -106,8 +108,7 @@ class BloodStockResponse(BloodStockBase):
     created_at: datetime
     updated_at: datetime
     
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 # ==================== INVENTORY ANALYTICS SCHEMAS ====================
 
@@ -1,11 +1,20 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, text, desc
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timedelta
-import json
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy import or_, func, desc, Table, update, case, select, bindparam, literal_column, cast, Integer, true
+from typing import List, Optional, Dict, Any, IO, Iterable, Iterator, Sequence
+from datetime import datetime, date, timedelta
+from collections import defaultdict
+from enum import Enum
+import csv
+import functools
+import io
 import logging
+import time
 import uuid
 
+from app.core.constants import BLOOD_GROUPS
+from app.db.ids import uuid7
 from app.models.blood_collection import BloodCollection
 from app.models.blood_usage import BloodUsage
 from app.models.blood_stock import BloodStock
@@ -17,6 +26,70 @@ from app.schemas.blood_bank import (
 
 logger = logging.getLogger(__name__)
 
+# Prebuilt statements for the hot stock lookups, constructed once per process
+_LATEST_STOCK_STMT = (
+    select(BloodStock)
+    .where(BloodStock.blood_group == bindparam('blood_group'))
+    .order_by(desc(BloodStock.stock_date))
+    .limit(1)
+)
+_STOCK_FOR_DATE_STMT = select(BloodStock).where(
+    BloodStock.blood_group == bindparam('blood_group'),
+    BloodStock.stock_date == bindparam('stock_date')
+)
+# Write paths lock the day's row so concurrent collections/usage don't lose updates
+_STOCK_FOR_DATE_FOR_UPDATE_STMT = _STOCK_FOR_DATE_STMT.with_for_update().execution_options(
+    populate_existing=True
+)
+
+# Latest stock row of every blood group in one round trip
+_ranked_stock = select(
+    BloodStock.blood_group,
+    BloodStock.total_available,
+    BloodStock.total_near_expiry,
+    BloodStock.total_expired,
+    BloodStock.updated_at,
+    func.row_number().over(
+        partition_by=BloodStock.blood_group,
+        order_by=desc(BloodStock.stock_date)
+    ).label('row_number')
+).subquery()
+_ALL_CURRENT_STOCKS_STMT = select(_ranked_stock).where(_ranked_stock.c.row_number == 1)
+
+# Total and recently created record counts of all three tables in one round trip (one scan per table)
+def _record_counts(model, total_label: str, recent_label: Optional[str] = None):
+    columns = [func.count().label(total_label)]
+    if recent_label:
+        columns.append(func.count().filter(model.created_at >= bindparam('since')).label(recent_label))
+    return select(*columns).select_from(model).subquery()
+
+_collection_counts = _record_counts(BloodCollection, 'total_collections', 'recent_collections')
+_usage_counts = _record_counts(BloodUsage, 'total_usage_records', 'recent_usage')
+_stock_counts = _record_counts(BloodStock, 'total_stock_records')
+_ACTIVITY_COUNTS_STMT = select(_collection_counts, _usage_counts, _stock_counts).select_from(
+    _collection_counts.join(_usage_counts, true()).join(_stock_counts, true())
+)
+
+# serialization_failure, deadlock_detected: the transaction was aborted and can simply be run again
+_RETRYABLE_SQLSTATES = frozenset({"40001", "40P01"})
+_MAX_WRITE_ATTEMPTS = 3
+
+def _retry_on_conflict(method):
+    """Re-run a stock-writing service method when PostgreSQL aborts it for a serialization failure or deadlock"""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        for attempt in range(1, _MAX_WRITE_ATTEMPTS + 1):
+            try:
+                return method(*args, **kwargs)
+            except DBAPIError as e:
+                sqlstate = getattr(e.orig, "sqlstate", None) or getattr(e.orig, "pgcode", None)
+                if sqlstate not in _RETRYABLE_SQLSTATES or attempt == _MAX_WRITE_ATTEMPTS:
+                    raise
+                # The method rolled back already; back off briefly before retrying
+                logger.warning("Retrying %s after %s (attempt %s)", method.__name__, sqlstate, attempt)
+                time.sleep(0.05 * 2 ** (attempt - 1))
+    return wrapper
+
 class BloodBankService:
     """
     Service layer for blood bank operations
@@ -28,13 +101,14 @@ class BloodBankService:
     
     # ==================== COLLECTION MANAGEMENT ====================
     
+    @_retry_on_conflict
     def create_collection(self, collection_data: BloodCollectionCreate, staff_id: int) -> BloodCollection:
         """
         Create new blood collection record and update stock
         """
         try:
             # Create collection record
-            collection_dict = collection_data.dict()
+            collection_dict = collection_data.model_dump()
             collection_dict['created_by'] = staff_id
             
             collection = BloodCollection(**collection_dict)
@@ -46,12 +120,12 @@ class BloodBankService:
             self._update_stock_from_collection(collection)
             
             self.db.commit()
-            logger.info(f"Created blood collection {collection.donation_record_id}")
+            logger.info("Created blood collection %s", collection.donation_record_id)
             return collection
             
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error creating collection: {e}")
+            logger.error("Error creating collection: %s", e)
             raise
     
     def get_collections(
@@ -60,19 +134,65 @@ class BloodBankService:
         collection_date_from: Optional[datetime] = None,
         collection_date_to: Optional[datetime] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        include_staff: bool = False,
+        after_id: Optional[uuid.UUID] = None
     ) -> List[BloodCollection]:
-        """Get blood collection records with filtering"""
+        """
+        Get blood collection records with filtering
+        
+        Records come in primary key order. Pass the last record's id as after_id to fetch the
+        next page with an index seek instead of skipping offset rows.
+        """
+        query = self._collections_query(
+            blood_type, collection_date_from, collection_date_to, include_staff, after_id
+        )
+        return query.offset(offset).limit(limit).all()
+    
+    def iter_collections(
+        self,
+        blood_type: Optional[str] = None,
+        collection_date_from: Optional[datetime] = None,
+        collection_date_to: Optional[datetime] = None,
+        include_staff: bool = False,
+        after_id: Optional[uuid.UUID] = None,
+        batch_size: int = 200
+    ) -> Iterator[BloodCollection]:
+        """
+        Stream blood collection records with the same filters as get_collections
+        
+        Rows are fetched from the cursor batch_size at a time, so exports and reports over
+        the whole table hold one batch in memory instead of the full result list.
+        """
+        query = self._collections_query(
+            blood_type, collection_date_from, collection_date_to, include_staff, after_id
+        )
+        yield from query.yield_per(batch_size)
+    
+    def _collections_query(
+        self,
+        blood_type: Optional[str],
+        collection_date_from: Optional[datetime],
+        collection_date_to: Optional[datetime],
+        include_staff: bool,
+        after_id: Optional[uuid.UUID]
+    ):
         query = self.db.query(BloodCollection)
         
+        # Load the recording staff member for all rows in one extra query
+        if include_staff:
+            query = query.options(selectinload(BloodCollection.created_by_user))
+        
         if blood_type:
             query = query.filter(BloodCollection.blood_type == blood_type)
         if collection_date_from:
             query = query.filter(BloodCollection.donation_date >= collection_date_from)
         if collection_date_to:
             query = query.filter(BloodCollection.donation_date <= collection_date_to)
+        if after_id:
+            query = query.filter(BloodCollection.donation_record_id > after_id)
         
-        return query.offset(offset).limit(limit).all()
+        return query.order_by(BloodCollection.donation_record_id)
     
     def update_collection(self, donation_record_id: str, update_data: BloodCollectionUpdate, staff_id: int) -> BloodCollection:
         """Update collection record"""
@@ -84,28 +204,86 @@ class BloodBankService:
             raise ValueError(f"Collection {donation_record_id} not found")
         
         # Update fields
-        for field, value in update_data.dict(exclude_unset=True).items():
+        for field, value in update_data.model_dump(exclude_unset=True).items():
             setattr(collection, field, value)
         
         collection.updated_at = datetime.utcnow()
         self.db.commit()
+        # The session keeps objects loaded after commit; reload what the updated_at trigger wrote
+        self.db.refresh(collection)
         
         return collection
     
+    @_retry_on_conflict
+    def create_collections_bulk(self, collections: List[BloodCollectionCreate], staff_id: int) -> int:
+        """
+        Create many blood collection records in one round trip and update stock once per blood type
+        """
+        if not collections:
+            return 0
+        
+        try:
+            columns = [
+                'donation_record_id', 'donor_age', 'donor_gender', 'donor_occupation',
+                'blood_type', 'collection_site', 'donation_date', 'expiry_date',
+                'collection_volume_ml', 'hemoglobin_g_dl', 'created_by'
+            ]
+            rows = []
+            volume_by_type = defaultdict(float)
+            last_record_by_type = {}
+            
+            for collection_data in collections:
+                row = collection_data.model_dump()
+                row['donation_record_id'] = uuid7()
+                row['created_by'] = staff_id
+                rows.append([row[column] for column in columns])
+                
+                blood_type = row['blood_type'].value
+                volume_by_type[blood_type] += row['collection_volume_ml']
+                last_record_by_type[blood_type] = row['donation_record_id']
+            
+            self._copy_rows(BloodCollection.__table__, columns, rows)
+            
+            # Make sure today's stock row exists for each blood type, then apply all volumes in one UPDATE.
+            # The date is read once so every step targets the same day's rows, even across midnight
+            today = date.today()
+            stock_records = {}
+            for blood_type in sorted(volume_by_type):  # consistent lock order across writers
+                stock_records[blood_type] = self._get_or_create_current_stock(blood_type, today)
+            self.db.flush()
+            
+            self._apply_volume_deltas(volume_by_type, last_record_by_type, today, 'donation_record_id')
+            
+            expiry_totals = self._get_expiry_totals(stock_records, today)
+            for blood_type, stock_record in stock_records.items():
+                stock_record.total_expired, stock_record.total_near_expiry = expiry_totals.get(blood_type, (0.0, 0.0))
+            
+            self.db.commit()
+            logger.info("Bulk created %s blood collections", len(rows))
+            return len(rows)
+            
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error bulk creating collections: %s", e)
+            raise
+    
     # ==================== USAGE MANAGEMENT ====================
     
+    @_retry_on_conflict
     def create_usage(self, usage_data: BloodUsageCreate, staff_id: int) -> BloodUsage:
         """
         Create new blood usage record and update stock
         """
         try:
-            # Check if sufficient stock available
-            current_stock = self._get_current_stock_volume(usage_data.blood_group)
-            if current_stock < usage_data.volume_given_out:
-                raise ValueError(f"Insufficient stock for {usage_data.blood_group}. Available: {current_stock}ml, Requested: {usage_data.volume_given_out}ml")
+            # Load today's stock record once; it serves both the availability check and the update
+            blood_group = usage_data.blood_group.value
+            stock_record = self._get_or_create_current_stock(blood_group)
+            if stock_record.total_available < usage_data.volume_given_out:
+                raise ValueError(f"Insufficient stock for {blood_group}. Available: {stock_record.total_available}ml, Requested: {usage_data.volume_given_out}ml")
             
             # Create usage record
-            usage_dict = usage_data.dict()
+            usage_dict = usage_data.model_dump()
+            usage_dict['blood_group'] = blood_group
             usage_dict['processed_by'] = staff_id
             
             usage = BloodUsage(**usage_dict)
@@ -114,15 +292,75 @@ class BloodBankService:
             self.db.flush()  # Get the ID without committing
             
             # Update stock with the usage
-            self._update_stock_from_usage(usage)
+            self._update_stock_from_usage(usage, stock_record)
             
             self.db.commit()
-            logger.info(f"Created blood usage {usage.usage_id}")
+            logger.info("Created blood usage %s", usage.usage_id)
             return usage
             
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error creating usage: {e}")
+            logger.error("Error creating usage: %s", e)
+            raise
+    
+    @_retry_on_conflict
+    def create_usage_bulk(self, usages: List[BloodUsageCreate], staff_id: int) -> int:
+        """
+        Create many blood usage records in one round trip and deduct stock once per blood group
+        
+        All or nothing: if any blood group lacks the total requested volume, a ValueError
+        is raised and no record is written.
+        """
+        if not usages:
+            return 0
+        
+        try:
+            columns = [
+                'usage_id', 'purpose', 'department', 'blood_group', 'volume_given_out',
+                'usage_date', 'individual_name', 'patient_location', 'processed_by'
+            ]
+            rows = []
+            volume_by_group = defaultdict(float)
+            last_record_by_group = {}
+            
+            for usage_data in usages:
+                row = usage_data.model_dump()
+                row['usage_id'] = uuid7()
+                row['blood_group'] = usage_data.blood_group.value
+                row['processed_by'] = staff_id
+                rows.append([row[column] for column in columns])
+                
+                volume_by_group[row['blood_group']] += row['volume_given_out']
+                last_record_by_group[row['blood_group']] = row['usage_id']
+            
+            # Lock today's stock row of each blood group and check the whole batch against it
+            today = date.today()
+            stock_records = {}
+            for blood_group in sorted(volume_by_group):  # consistent lock order across writers
+                stock_record = self._get_or_create_current_stock(blood_group, today)
+                if stock_record.total_available < volume_by_group[blood_group]:
+                    raise ValueError(f"Insufficient stock for {blood_group}. Available: {stock_record.total_available}ml, Requested: {volume_by_group[blood_group]}ml")
+                stock_records[blood_group] = stock_record
+            
+            self._copy_rows(BloodUsage.__table__, columns, rows)
+            self._apply_volume_deltas(
+                {blood_group: -volume for blood_group, volume in volume_by_group.items()},
+                last_record_by_group,
+                today,
+                'usage_record_id'
+            )
+            
+            expiry_totals = self._get_expiry_totals(stock_records, today)
+            for blood_group, stock_record in stock_records.items():
+                stock_record.total_expired, stock_record.total_near_expiry = expiry_totals.get(blood_group, (0.0, 0.0))
+            
+            self.db.commit()
+            logger.info("Bulk created %s blood usage records", len(rows))
+            return len(rows)
+            
+        except Exception as e:
+            self.db.rollback()
+            logger.error("Error bulk creating usage records: %s", e)
             raise
     
     def get_usage_records(
@@ -132,31 +370,78 @@ class BloodBankService:
         usage_date_to: Optional[datetime] = None,
         patient_location: Optional[str] = None,
         limit: int = 100,
-        offset: int = 0
+        offset: int = 0,
+        include_staff: bool = False,
+        after_id: Optional[uuid.UUID] = None
     ) -> List[BloodUsage]:
-        """Get blood usage records with filtering"""
+        """
+        Get blood usage records with filtering
+        
+        Records come in primary key order; pass the last record's id as after_id for keyset paging.
+        """
+        query = self._usage_query(
+            blood_group, usage_date_from, usage_date_to, patient_location, include_staff, after_id
+        )
+        return query.offset(offset).limit(limit).all()
+    
+    def iter_usage_records(
+        self,
+        blood_group: Optional[str] = None,
+        usage_date_from: Optional[datetime] = None,
+        usage_date_to: Optional[datetime] = None,
+        patient_location: Optional[str] = None,
+        include_staff: bool = False,
+        after_id: Optional[uuid.UUID] = None,
+        batch_size: int = 200
+    ) -> Iterator[BloodUsage]:
+        """Stream blood usage records batch_size rows at a time, filtered like get_usage_records"""
+        query = self._usage_query(
+            blood_group, usage_date_from, usage_date_to, patient_location, include_staff, after_id
+        )
+        yield from query.yield_per(batch_size)
+    
+    def _usage_query(
+        self,
+        blood_group: Optional[str],
+        usage_date_from: Optional[datetime],
+        usage_date_to: Optional[datetime],
+        patient_location: Optional[str],
+        include_staff: bool,
+        after_id: Optional[uuid.UUID]
+    ):
         query = self.db.query(BloodUsage)
         
+        # Load the processing staff member for all rows in one extra query
+        if include_staff:
+            query = query.options(selectinload(BloodUsage.processed_by_user))
+        
         if blood_group:
             query = query.filter(BloodUsage.blood_group == blood_group)
         if usage_date_from:
-            query = query.filter(BloodUsage.time >= usage_date_from)
+            query = query.filter(BloodUsage.usage_date >= usage_date_from)
         if usage_date_to:
-            query = query.filter(BloodUsage.time <= usage_date_to)
+            query = query.filter(BloodUsage.usage_date <= usage_date_to)
         if patient_location:
-            query = query.filter(BloodUsage.patient_location.ilike(f"%{patient_location}%"))
+            # Served by the trigram index on PostgreSQL (patterns of 3+ characters). The search text is
+            # matched literally: escaping % and _ keeps a stray wildcard from turning into a match-all scan
+            escaped_location = (
+                patient_location.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            )
+            query = query.filter(BloodUsage.patient_location.ilike(f"%{escaped_location}%", escape="\\"))
+        if after_id:
+            query = query.filter(BloodUsage.usage_id > after_id)
         
-        return query.offset(offset).limit(limit).all()
+        return query.order_by(BloodUsage.usage_id)
     
     # ==================== STOCK MANAGEMENT ====================
     
     def get_current_inventory(self) -> List[Dict[str, Any]]:
         """Get current inventory levels for all blood groups"""
-        blood_groups = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
         inventory = []
+        current_stocks = self._get_all_current_stocks()
         
-        for blood_group in blood_groups:
-            stock_data = self._get_current_stock_data(blood_group)
+        for blood_group in BLOOD_GROUPS:
+            stock_data = current_stocks.get(blood_group) or self._empty_stock_data()
             
             inventory.append({
                 "blood_group": blood_group,
@@ -184,9 +469,7 @@ class BloodBankService:
     
     def _get_current_stock_data(self, blood_group: str) -> Dict[str, Any]:
         """Get current stock data for a blood group"""
-        latest_stock = self.db.query(BloodStock).filter(
-            BloodStock.blood_group == blood_group
-        ).order_by(desc(BloodStock.stock_date)).first()
+        latest_stock = self._get_latest_stock(blood_group)
         
         if latest_stock:
             return {
@@ -196,22 +479,39 @@ class BloodBankService:
                 "last_updated": latest_stock.updated_at
             }
         else:
-            return {
-                "total_available": 0.0,
-                "total_near_expiry": 0.0,
-                "total_expired": 0.0,
-                "last_updated": datetime.utcnow()
+            return self._empty_stock_data()
+    
+    def _get_all_current_stocks(self) -> Dict[str, Dict[str, Any]]:
+        """Get current stock data for every blood group that has stock records, in one query"""
+        return {
+            row.blood_group: {
+                "total_available": row.total_available,
+                "total_near_expiry": row.total_near_expiry,
+                "total_expired": row.total_expired,
+                "last_updated": row.updated_at
             }
+            for row in self.db.execute(_ALL_CURRENT_STOCKS_STMT)
+        }
+    
+    def _empty_stock_data(self) -> Dict[str, Any]:
+        """Stock data for a blood group with no stock records yet"""
+        return {
+            "total_available": 0.0,
+            "total_near_expiry": 0.0,
+            "total_expired": 0.0,
+            "last_updated": datetime.utcnow()
+        }
     
     # ==================== ALERTS AND MONITORING ====================
     
     def get_low_stock_alerts(self, threshold_ml: float = 1000.0) -> List[Dict[str, Any]]:
         """Get blood groups with low stock levels"""
-        blood_groups = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
         alerts = []
         
-        for blood_group in blood_groups:
-            stock_data = self._get_current_stock_data(blood_group)
+        current_stocks = self._get_all_current_stocks()
+        
+        for blood_group in BLOOD_GROUPS:
+            stock_data = current_stocks.get(blood_group) or self._empty_stock_data()
             current_volume = stock_data["total_available"]
             
             if current_volume < threshold_ml:
@@ -225,62 +525,84 @@ class BloodBankService:
         
         return alerts
     
+    def get_activity_counts(self, since: datetime) -> Dict[str, int]:
+        """Get total record counts and the number of collections/usage records created since a timestamp"""
+        return dict(self.db.execute(_ACTIVITY_COUNTS_STMT, {"since": since}).one()._mapping)
+    
     def get_expiry_alerts(self, days_ahead: int = 7) -> List[Dict[str, Any]]:
         """Get blood units expiring within specified days"""
-        cutoff_date = datetime.utcnow() + timedelta(days=days_ahead)
-        
-        expiring_collections = self.db.query(BloodCollection).filter(
-            BloodCollection.expiry_date <= cutoff_date,
-            BloodCollection.expiry_date > datetime.utcnow()
-        ).all()
+        return list(self.iter_expiry_alerts(days_ahead))
+    
+    def iter_expiry_alerts(self, days_ahead: int = 7) -> Iterator[Dict[str, Any]]:
+        """Stream expiry alerts one dict at a time as rows arrive from the cursor"""
+        today = date.today()
+        cutoff_date = today + timedelta(days=days_ahead)
+        
+        # Select only the alert columns and stream them in batches instead of loading full collections.
+        # Soonest expiry first: the expiry_date index returns rows already in this order
+        expiring_collections = self.db.execute(
+            select(
+                BloodCollection.donation_record_id,
+                BloodCollection.blood_type,
+                BloodCollection.collection_volume_ml,
+                BloodCollection.expiry_date,
+                self._days_until(BloodCollection.expiry_date, today).label("days_until_expiry")
+            ).where(
+                BloodCollection.expiry_date <= cutoff_date,
+                BloodCollection.expiry_date > today
+            ).order_by(BloodCollection.expiry_date).execution_options(yield_per=500)
+        )
         
-        alerts = []
         for collection in expiring_collections:
-            alerts.append({
+            yield {
                 "donation_record_id": str(collection.donation_record_id),
                 "blood_type": collection.blood_type,
                 "volume_ml": collection.collection_volume_ml,
                 "expiry_date": collection.expiry_date,
-                "days_until_expiry": (collection.expiry_date - datetime.utcnow()).days,
-                "donor_name": collection.donor_name
-            })
-        
-        return alerts
+                "days_until_expiry": collection.days_until_expiry
+            }
     
     # ==================== ANALYTICS ====================
     
     def get_inventory_analytics(self, days_back: int = 30) -> Dict[str, Any]:
         """Get comprehensive inventory analytics"""
-        start_date = datetime.utcnow() - timedelta(days=days_back)
+        start_date = (datetime.utcnow() - timedelta(days=days_back)).date()
         
         # Current inventory
         current_inventory = self.get_current_inventory()
         
-        # Collection analytics
-        collections = self.db.query(BloodCollection).filter(
-            BloodCollection.donation_date >= start_date
-        ).all()
-        
-        collections_by_type = {}
-        for collection in collections:
-            blood_type = collection.blood_type
-            if blood_type not in collections_by_type:
-                collections_by_type[blood_type] = {"total_volume_ml": 0, "total_units": 0}
-            collections_by_type[blood_type]["total_volume_ml"] += collection.collection_volume_ml
-            collections_by_type[blood_type]["total_units"] += 1
-        
-        # Usage analytics
-        usage_records = self.db.query(BloodUsage).filter(
-            BloodUsage.time >= start_date
-        ).all()
-        
-        usage_by_type = {}
-        for usage in usage_records:
-            blood_group = usage.blood_group
-            if blood_group not in usage_by_type:
-                usage_by_type[blood_group] = {"total_volume_ml": 0, "total_units": 0}
-            usage_by_type[blood_group]["total_volume_ml"] += usage.volume_given_out
-            usage_by_type[blood_group]["total_units"] += 1
+        if self.db.get_bind().dialect.name == "postgresql":
+            # Let PostgreSQL build both lists as one JSON document; the driver hands back plain lists
+            period_totals = self.db.execute(self._period_totals_json_stmt(start_date)).scalar_one()
+            return {
+                "period_days": days_back,
+                "current_inventory": current_inventory,
+                **period_totals
+            }
+        
+        # Collection analytics, aggregated per blood type in the database
+        collections_by_type = {
+            blood_type: {"total_volume_ml": total_volume_ml, "total_units": total_units}
+            for blood_type, total_volume_ml, total_units in self.db.query(
+                BloodCollection.blood_type,
+                func.sum(BloodCollection.collection_volume_ml),
+                func.count()
+            ).filter(
+                BloodCollection.donation_date >= start_date
+            ).group_by(BloodCollection.blood_type).all()
+        }
+        
+        # Usage analytics, aggregated per blood group in the database
+        usage_by_type = {
+            blood_group: {"total_volume_ml": total_volume_ml, "total_units": total_units}
+            for blood_group, total_volume_ml, total_units in self.db.query(
+                BloodUsage.blood_group,
+                func.sum(BloodUsage.volume_given_out),
+                func.count()
+            ).filter(
+                BloodUsage.usage_date >= start_date
+            ).group_by(BloodUsage.blood_group).all()
+        }
         
         return {
             "period_days": days_back,
@@ -289,123 +611,294 @@ class BloodBankService:
             "usage": [{"blood_group": k, **v} for k, v in usage_by_type.items()]
         }
     
+    def _period_totals_json_stmt(self, start_date: date):
+        """json_build_object of per-group collection and usage totals since start_date (PostgreSQL only)"""
+        collections = select(
+            BloodCollection.blood_type.label("group_key"),
+            func.sum(BloodCollection.collection_volume_ml).label("total_volume_ml"),
+            func.count().label("total_units")
+        ).where(
+            BloodCollection.donation_date >= start_date
+        ).group_by(BloodCollection.blood_type).subquery()
+        
+        usage = select(
+            BloodUsage.blood_group.label("group_key"),
+            func.sum(BloodUsage.volume_given_out).label("total_volume_ml"),
+            func.count().label("total_units")
+        ).where(
+            BloodUsage.usage_date >= start_date
+        ).group_by(BloodUsage.blood_group).subquery()
+        
+        def json_list(totals, key_name: str):
+            return select(func.coalesce(
+                func.json_agg(func.json_build_object(
+                    key_name, totals.c.group_key,
+                    "total_volume_ml", totals.c.total_volume_ml,
+                    "total_units", totals.c.total_units
+                )),
+                literal_column("'[]'::json")
+            )).scalar_subquery()
+        
+        return select(func.json_build_object(
+            "collections", json_list(collections, "blood_type"),
+            "usage", json_list(usage, "blood_group")
+        ))
+    
+    # ==================== BULK LOADING ====================
+    
+    def bulk_load_csv(self, table: Table, file_like: IO[str], columns: Sequence[str]) -> None:
+        """
+        Stream CSV data into a table with PostgreSQL COPY
+        
+        Runs on the session's connection so the load shares the current transaction.
+        """
+        dbapi_connection = self.db.connection().connection
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH CSV",
+                file_like
+            )
+        finally:
+            cursor.close()
+    
+    def _copy_rows(self, table: Table, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+        """Bulk insert rows, using COPY on PostgreSQL and a multi-row INSERT elsewhere"""
+        connection = self.db.connection()
+        
+        if connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg2":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for row in rows:
+                writer.writerow([value.value if isinstance(value, Enum) else value for value in row])
+            buffer.seek(0)
+            self.bulk_load_csv(table, buffer, columns)
+        else:
+            self.db.execute(table.insert(), [dict(zip(columns, row)) for row in rows])
+    
     # ==================== PRIVATE HELPER METHODS ====================
     
     def _update_stock_from_collection(self, collection: BloodCollection):
         """Update stock levels when blood is collected"""
+        self._add_collected_volume(
+            collection.blood_type,
+            collection.collection_volume_ml,
+            collection.donation_record_id
+        )
+    
+    def _add_collected_volume(self, blood_type: str, volume_ml: float, donation_record_id: uuid.UUID):
+        """Add collected volume to the current stock record of a blood type"""
         try:
-            # Get or create current stock record for this blood group
-            stock_record = self._get_or_create_current_stock(collection.blood_type)
+            today = date.today()
+            total_expired, total_near_expiry = self._get_expiry_totals(
+                [blood_type], today
+            ).get(blood_type, (0.0, 0.0))
             
-            # Update total available with new collection
-            stock_record.total_available += collection.collection_volume_ml
-            
-            # Update expiry categories based on expiry date
-            self._update_expiry_categories(stock_record, collection.blood_type)
+            # Additions commute, so one upsert needs no lock beforehand: it adds to today's record,
+            # or creates it with the latest total carried forward when the day has no record yet
+            stock = BloodStock.__table__
+            carried_available = (
+                select(stock.c.total_available)
+                .where(stock.c.blood_group == blood_type)
+                .order_by(desc(stock.c.stock_date))
+                .limit(1)
+                .scalar_subquery()
+            )
+            stmt = (
+                self._dialect_insert(stock)
+                .values(
+                    stock_id=uuid7(),
+                    blood_group=blood_type,
+                    stock_date=today,
+                    total_available=func.coalesce(carried_available, 0.0) + volume_ml,
+                    total_near_expiry=total_near_expiry,
+                    total_expired=total_expired,
+                    donation_record_id=donation_record_id
+                )
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=['blood_group', 'stock_date'],
+                set_={
+                    "total_available": stock.c.total_available + volume_ml,
+                    "total_near_expiry": total_near_expiry,
+                    "total_expired": total_expired,
+                    "donation_record_id": donation_record_id
+                }
+            ).returning(stock.c.total_available)
             
-            # Set reference to collection
-            stock_record.donation_record_id = collection.donation_record_id
+            new_total = self.db.execute(stmt).scalar_one()
             
-            self.db.add(stock_record)
-            logger.info(f"Updated stock for {collection.blood_type}: +{collection.collection_volume_ml}ml")
+            logger.info("Updated stock for %s: +%sml (%sml available)", blood_type, volume_ml, new_total)
             
         except Exception as e:
-            logger.error(f"Error updating stock from collection: {e}")
+            logger.error("Error updating stock from collection: %s", e)
             raise
     
-    def _update_stock_from_usage(self, usage: BloodUsage):
+    def _apply_volume_deltas(
+        self,
+        delta_by_group: Dict[str, float],
+        record_by_group: Dict[str, uuid.UUID],
+        today: date,
+        record_column: str
+    ):
+        """Apply volume changes and record references to today's stock records of several blood groups in a single UPDATE"""
+        record_ref = getattr(BloodStock, record_column)
+        self.db.execute(
+            update(BloodStock)
+            .where(
+                BloodStock.blood_group.in_(list(delta_by_group)),
+                BloodStock.stock_date == today
+            )
+            .values({
+                BloodStock.total_available: BloodStock.total_available + case(
+                    delta_by_group, value=BloodStock.blood_group, else_=0.0
+                ),
+                record_ref: case(
+                    record_by_group, value=BloodStock.blood_group, else_=record_ref
+                )
+            })
+            .execution_options(synchronize_session="fetch")
+        )
+        
+        for blood_group, delta_ml in delta_by_group.items():
+            logger.info("Updated stock for %s: %+gml", blood_group, delta_ml)
+    
+    def _update_stock_from_usage(self, usage: BloodUsage, stock_record: Optional[BloodStock] = None):
         """Update stock levels when blood is used"""
         try:
             # Get or create current stock record for this blood group
-            stock_record = self._get_or_create_current_stock(usage.blood_group)
+            if stock_record is None:
+                stock_record = self._get_or_create_current_stock(usage.blood_group)
             
-            # Deduct from total available
-            if stock_record.total_available >= usage.volume_given_out:
-                stock_record.total_available -= usage.volume_given_out
-            else:
+            # Deduct from total available; the UPDATE only matches while enough stock is left
+            remaining = self._apply_stock_change(
+                usage.blood_group, stock_record.stock_date, -usage.volume_given_out, usage_record_id=usage.usage_id
+            )
+            if remaining is None:
                 raise ValueError(f"Insufficient stock for {usage.blood_group}. Available: {stock_record.total_available}ml, Requested: {usage.volume_given_out}ml")
             
-            # Update expiry categories
-            self._update_expiry_categories(stock_record, usage.blood_group)
-            
-            # Set reference to usage
-            stock_record.usage_record_id = usage.usage_id
-            
-            self.db.add(stock_record)
-            logger.info(f"Updated stock for {usage.blood_group}: -{usage.volume_given_out}ml")
+            logger.info("Updated stock for %s: -%sml (%sml left)", usage.blood_group, usage.volume_given_out, remaining)
             
         except Exception as e:
-            logger.error(f"Error updating stock from usage: {e}")
+            logger.error("Error updating stock from usage: %s", e)
             raise
     
-    def _get_or_create_current_stock(self, blood_group: str) -> BloodStock:
-        """Get current stock record or create new one for blood group"""
-        from datetime import date
-        
-        today = date.today()
+    def _get_or_create_current_stock(self, blood_group: str, today: Optional[date] = None) -> BloodStock:
+        """Get current stock record (locked for update) or create new one for blood group"""
+        today = today or date.today()
+        params = {"blood_group": blood_group, "stock_date": today}
         
         # Try to get today's stock record
-        stock_record = self.db.query(BloodStock).filter(
-            and_(
-                BloodStock.blood_group == blood_group,
-                BloodStock.stock_date == today
-            )
-        ).first()
+        stock_record = self.db.execute(_STOCK_FOR_DATE_FOR_UPDATE_STMT, params).scalars().first()
         
         if not stock_record:
             # Get latest stock record to carry forward totals
-            latest_stock = self.db.query(BloodStock).filter(
-                BloodStock.blood_group == blood_group
-            ).order_by(desc(BloodStock.stock_date)).first()
-            
-            # Create new stock record for today
-            stock_record = BloodStock(
-                blood_group=blood_group,
-                stock_date=today,
-                total_available=latest_stock.total_available if latest_stock else 0.0,
-                total_near_expiry=latest_stock.total_near_expiry if latest_stock else 0.0,
-                total_expired=latest_stock.total_expired if latest_stock else 0.0
+            latest_stock = self._get_latest_stock(blood_group)
+            
+            # Create today's record; a concurrent writer may have created it first, which is fine
+            self.db.execute(
+                self._dialect_insert(BloodStock.__table__)
+                .values(
+                    stock_id=uuid7(),
+                    blood_group=blood_group,
+                    stock_date=today,
+                    total_available=latest_stock.total_available if latest_stock else 0.0,
+                    total_near_expiry=latest_stock.total_near_expiry if latest_stock else 0.0,
+                    total_expired=latest_stock.total_expired if latest_stock else 0.0
+                )
+                .on_conflict_do_nothing(index_elements=['blood_group', 'stock_date'])
             )
+            stock_record = self.db.execute(_STOCK_FOR_DATE_FOR_UPDATE_STMT, params).scalars().one()
         
         return stock_record
     
-    def _update_expiry_categories(self, stock_record: BloodStock, blood_group: str):
-        """Update near expiry and expired categories based on current collections"""
-        from datetime import date, timedelta
-        
-        today = date.today()
-        near_expiry_threshold = today + timedelta(days=7)  # 7 days warning
+    def _dialect_insert(self, table: Table):
+        """Dialect-specific INSERT supporting ON CONFLICT DO NOTHING / DO UPDATE"""
+        if self.db.get_bind().dialect.name == "postgresql":
+            return postgresql.insert(table)
+        return sqlite.insert(table)
+    
+    def _apply_stock_change(
+        self,
+        blood_group: str,
+        stock_date: date,
+        volume_delta: float,
+        **record_refs
+    ) -> Optional[float]:
+        """
+        Apply a volume change, refreshed expiry categories and record references to a stock record in one UPDATE
         
-        # Query collections that are still in stock
-        collections = self.db.query(BloodCollection).filter(
-            BloodCollection.blood_type == blood_group
-        ).all()
+        Returns the new total available, or None when there is no record for the date
+        or a deduction would take the stock below zero.
+        """
+        total_expired, total_near_expiry = self._get_expiry_totals(
+            [blood_group], stock_date
+        ).get(blood_group, (0.0, 0.0))
+        
+        # Core UPDATE: no autoflush of pending attribute changes, and the delta is
+        # applied to the stored value rather than a value read earlier
+        stmt = (
+            update(BloodStock)
+            .where(BloodStock.blood_group == blood_group, BloodStock.stock_date == stock_date)
+            .values(
+                total_available=BloodStock.total_available + volume_delta,
+                total_near_expiry=total_near_expiry,
+                total_expired=total_expired,
+                **record_refs
+            )
+            .returning(BloodStock.total_available)
+            .execution_options(synchronize_session="fetch")
+        )
+        if volume_delta < 0:
+            stmt = stmt.where(BloodStock.total_available >= -volume_delta)
         
-        total_near_expiry = 0.0
-        total_expired = 0.0
+        return self.db.execute(stmt).scalar_one_or_none()
+    
+    def _get_expiry_totals(self, blood_groups: Iterable[str], today: Optional[date] = None) -> Dict[str, tuple]:
+        """Get (expired, near expiry) collection volumes per blood group in one grouped query"""
+        today = today or date.today()
+        near_expiry_threshold = today + timedelta(days=7)  # 7 days warning
         
-        for collection in collections:
-            # Check if this collection has been used up (simplified logic)
-            if collection.expiry_date <= today:
-                total_expired += collection.collection_volume_ml
-            elif collection.expiry_date <= near_expiry_threshold:
-                total_near_expiry += collection.collection_volume_ml
+        # Sum expired and near-expiry volumes in the database instead of loading every collection
+        rows = self.db.query(
+            BloodCollection.blood_type,
+            func.coalesce(func.sum(case(
+                (BloodCollection.expiry_date <= today, BloodCollection.collection_volume_ml),
+                else_=0.0
+            )), 0.0),
+            func.coalesce(func.sum(case(
+                (BloodCollection.expiry_date <= today, 0.0),
+                (BloodCollection.expiry_date <= near_expiry_threshold, BloodCollection.collection_volume_ml),
+                else_=0.0
+            )), 0.0)
+        ).filter(
+            BloodCollection.blood_type.in_(list(blood_groups))
+        ).group_by(BloodCollection.blood_type).all()
         
-        stock_record.total_near_expiry = total_near_expiry
-        stock_record.total_expired = total_expired
+        return {
+            blood_type: (float(total_expired), float(total_near_expiry))
+            for blood_type, total_expired, total_near_expiry in rows
+        }
+    
+    def _days_until(self, date_column, today: date):
+        """SQL expression for the whole days from today until a date column"""
+        if self.db.get_bind().dialect.name == "postgresql":
+            # date - date is an integer number of days in PostgreSQL
+            return cast(date_column - today, Integer)
+        return cast(func.julianday(date_column) - func.julianday(today), Integer)
+    
+    def _get_latest_stock(self, blood_group: str) -> Optional[BloodStock]:
+        """Get the most recent stock record for a blood group"""
+        return self.db.execute(_LATEST_STOCK_STMT, {"blood_group": blood_group}).scalars().first()
     
     def _get_current_stock_volume(self, blood_group: str) -> float:
         """Get current total available stock volume for a blood group"""
-        latest_stock = self.db.query(BloodStock).filter(
-            BloodStock.blood_group == blood_group
-        ).order_by(desc(BloodStock.stock_date)).first()
+        latest_stock = self._get_latest_stock(blood_group)
         
         return latest_stock.total_available if latest_stock else 0.0
     
     def _get_last_stock_update(self, blood_group: str) -> Optional[datetime]:
         """Get timestamp of last stock update for a blood group"""
-        latest_stock = self.db.query(BloodStock).filter(
-            BloodStock.blood_group == blood_group
-        ).order_by(desc(BloodStock.stock_date)).first()
+        latest_stock = self._get_latest_stock(blood_group)
         
         return latest_stock.created_at if latest_stock else None
@@ -7,23 +7,12 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import create_engine
-from app.db.database import Base
+from app.db.database import Base, engine
 from app.models import User, BloodCollection, BloodUsage, BloodStock
-from dotenv import load_dotenv
 
 def create_database_tables():
     """Create all database tables"""
-    load_dotenv()
-    
-    # Get DATABASE_URL from environment
-    DATABASE_URL = os.getenv('DATABASE_URL')
-    
-    if not DATABASE_URL:
-        raise ValueError("DATABASE_URL environment variable is not set")
-    
-    engine = create_engine(DATABASE_URL)
-    
+    # The application's engine (DATABASE_URL from the environment or .env) and its pool settings
     print('🩸 Creating Blood Bank Database Tables...')
     
     # Create all tables
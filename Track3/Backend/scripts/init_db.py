@@ -11,8 +11,13 @@ from pathlib import Path
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
+from datetime import date
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects import postgresql, sqlite
 from app.db.database import Base, engine, SessionLocal
 from app.models.user import User
+from app.models.blood_stock import BloodStock
+from app.core.constants import BLOOD_GROUPS
 from app.core.config import settings
 import logging
 
@@ -30,142 +35,151 @@ def create_tables():
         logger.error(f"❌ Error creating database tables: {e}")
         return False
 
-def create_admin_user():
-    """Create default admin user"""
-    db = SessionLocal()
-    try:
-        # Check if admin user already exists
-        admin_user = db.query(User).filter(User.username == "admin").first()
-        
-        if admin_user:
-            logger.info("ℹ️ Admin user already exists")
-            return True
-        
-        # Create admin user
-        admin = User(
-            username="admin",
-            email="admin@bloodbank.com",
-            full_name="System Administrator",
-            hashed_password=User.hash_password("Admin123!"),
-            role="admin",
-            department="Administration",
-            is_active=True,
-            is_verified=True,
-            can_manage_inventory=True,
-            can_view_forecasts=True,
-            can_manage_donors=True,
-            can_access_reports=True,
-            can_manage_users=True,
-            can_view_analytics=True,
-            employee_id="ADMIN001",
-            position="System Administrator"
-        )
-        
-        db.add(admin)
-        db.commit()
-        
-        logger.info("✅ Admin user created successfully")
-        logger.info("📧 Username: admin")
-        logger.info("🔑 Password: Admin123!")
-        
-        return True
-        
-    except Exception as e:
-        logger.error(f"❌ Error creating admin user: {e}")
-        db.rollback()
-        return False
-    finally:
-        db.close()
+def insert_users(db: Session, rows):
+    """Insert user rows, skipping existing ones; returns the usernames actually created"""
+    # ON CONFLICT DO NOTHING replaces a SELECT-then-INSERT check, so concurrent init runs can't collide
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    result = db.execute(
+        insert(User.__table__)
+        .values(rows)
+        .on_conflict_do_nothing()
+        .returning(User.username)
+    )
+    return set(result.scalars())
 
-def create_sample_users():
-    """Create sample users for testing"""
-    db = SessionLocal()
+def create_admin_user(db: Session):
+    """Add the default admin user"""
+    created = insert_users(db, [{
+        "username": "admin",
+        "email": "admin@bloodbank.com",
+        "full_name": "System Administrator",
+        "hashed_password": User.hash_password("Admin123!"),
+        "role": "admin",
+        "department": "Administration",
+        "is_active": True,
+        "is_verified": True,
+        "can_manage_inventory": True,
+        "can_view_forecasts": True,
+        "can_manage_donors": True,
+        "can_access_reports": True,
+        "can_manage_users": True,
+        "can_view_analytics": True
+    }])
+    
+    if not created:
+        logger.info("ℹ️ Admin user already exists")
+        return
+    
+    logger.info("✅ Admin user created successfully")
+    logger.info("📧 Username: admin")
+    logger.info("🔑 Password: Admin123!")
+
+def create_sample_users(db: Session):
+    """Add sample users for testing to the session"""
+    sample_users = [
+        {
+            "username": "manager1",
+            "email": "manager@bloodbank.com",
+            "full_name": "Blood Bank Manager",
+            "password": "Manager123!",
+            "role": "manager",
+            "department": "Blood Bank",
+            "can_manage_inventory": True,
+            "can_manage_donors": True,
+        },
+        {
+            "username": "staff1",
+            "email": "staff@bloodbank.com",
+            "full_name": "Blood Bank Staff",
+            "password": "Staff123!",
+            "role": "staff",
+            "department": "Blood Bank",
+            "can_manage_inventory": False,
+            "can_manage_donors": True,
+        },
+        {
+            "username": "viewer1",
+            "email": "viewer@bloodbank.com",
+            "full_name": "Report Viewer",
+            "password": "Viewer123!",
+            "role": "viewer",
+            "department": "Clinical",
+            "can_manage_inventory": False,
+            "can_manage_donors": False,
+        }
+    ]
+    
+    rows = [
+        {
+            "username": user_data["username"],
+            "email": user_data["email"],
+            "full_name": user_data["full_name"],
+            "hashed_password": User.hash_password(user_data["password"]),
+            "role": user_data["role"],
+            "department": user_data["department"],
+            "is_active": True,
+            "is_verified": True,
+            "can_manage_inventory": user_data.get("can_manage_inventory", False),
+            "can_view_forecasts": True,
+            "can_manage_donors": user_data.get("can_manage_donors", False),
+            "can_access_reports": True,
+            "can_manage_users": False,
+            "can_view_analytics": True
+        }
+        for user_data in sample_users
+    ]
+    
+    # Insert all sample users in one statement; existing ones are skipped by the database
+    created = insert_users(db, rows)
+    
+    for user_data in sample_users:
+        if user_data["username"] not in created:
+            logger.info(f"ℹ️ User {user_data['username']} already exists")
+    
+    if created:
+        logger.info(f"✅ Created {len(created)} sample users")
+
+def create_initial_stock(db: Session):
+    """Add an empty stock record for every blood group that has none yet"""
+    stocked_groups = {blood_group for (blood_group,) in db.query(BloodStock.blood_group).distinct()}
+    today = date.today()
+    rows = [
+        {
+            "blood_group": blood_group,
+            "stock_date": today,
+            "total_available": 0.0,
+            "total_near_expiry": 0.0,
+            "total_expired": 0.0
+        }
+        for blood_group in BLOOD_GROUPS
+        if blood_group not in stocked_groups
+    ]
+    
+    if not rows:
+        logger.info("ℹ️ Stock records already exist for all blood groups")
+        return
+    
+    # One multi-row INSERT; rows another init run created meanwhile are skipped
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    db.execute(
+        insert(BloodStock.__table__)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=["blood_group", "stock_date"])
+    )
+    logger.info(f"✅ Created initial stock records for {len(rows)} blood groups")
+
+def seed_database():
+    """Create the admin and sample users and the initial stock records in a single transaction"""
     try:
-        sample_users = [
-            {
-                "username": "manager1",
-                "email": "manager@bloodbank.com",
-                "full_name": "Blood Bank Manager",
-                "password": "Manager123!",
-                "role": "manager",
-                "department": "Blood Bank",
-                "employee_id": "MGR001",
-                "position": "Blood Bank Manager",
-                "can_manage_inventory": True,
-                "can_manage_donors": True,
-            },
-            {
-                "username": "staff1",
-                "email": "staff@bloodbank.com",
-                "full_name": "Blood Bank Staff",
-                "password": "Staff123!",
-                "role": "staff",
-                "department": "Blood Bank",
-                "employee_id": "STF001",
-                "position": "Laboratory Technician",
-                "can_manage_inventory": False,
-                "can_manage_donors": True,
-            },
-            {
-                "username": "viewer1",
-                "email": "viewer@bloodbank.com",
-                "full_name": "Report Viewer",
-                "password": "Viewer123!",
-                "role": "viewer",
-                "department": "Clinical",
-                "employee_id": "VWR001",
-                "position": "Clinical Coordinator",
-                "can_manage_inventory": False,
-                "can_manage_donors": False,
-            }
-        ]
-        
-        created_count = 0
-        
-        for user_data in sample_users:
-            # Check if user already exists
-            existing_user = db.query(User).filter(User.username == user_data["username"]).first()
-            
-            if existing_user:
-                logger.info(f"ℹ️ User {user_data['username']} already exists")
-                continue
-            
-            # Create user
-            user = User(
-                username=user_data["username"],
-                email=user_data["email"],
-                full_name=user_data["full_name"],
-                hashed_password=User.hash_password(user_data["password"]),
-                role=user_data["role"],
-                department=user_data["department"],
-                employee_id=user_data["employee_id"],
-                position=user_data["position"],
-                is_active=True,
-                is_verified=True,
-                can_manage_inventory=user_data.get("can_manage_inventory", False),
-                can_view_forecasts=True,
-                can_manage_donors=user_data.get("can_manage_donors", False),
-                can_access_reports=True,
-                can_manage_users=False,
-                can_view_analytics=True
-            )
-            
-            db.add(user)
-            created_count += 1
-        
-        db.commit()
-        
-        if created_count > 0:
-            logger.info(f"✅ Created {created_count} sample users")
-        
+        # One session and one commit for all seed rows
+        with SessionLocal() as db, db.begin():
+            create_admin_user(db)
+            create_sample_users(db)
+            create_initial_stock(db)
         return True
-        
     except Exception as e:
-        logger.error(f"❌ Error creating sample users: {e}")
-        db.rollback()
+        logger.error(f"❌ Error seeding database: {e}")
         return False
-    finally:
-        db.close()
 
 def main():
     """Main initialization function"""
@@ -176,14 +190,9 @@ def main():
         logger.error("❌ Failed to create database tables")
         sys.exit(1)
     
-    # Create admin user
-    if not create_admin_user():
-        logger.error("❌ Failed to create admin user")
-        sys.exit(1)
-    
-    # Create sample users
-    if not create_sample_users():
-        logger.error("❌ Failed to create sample users")
+    # Create admin and sample users and initial stock records
+    if not seed_database():
+        logger.error("❌ Failed to seed database")
         sys.exit(1)
     
     logger.info("✅ Database initialization completed successfully!")
@@ -10,25 +10,148 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
+from sqlalchemy import text
+from app.core.constants import BLOOD_GROUPS, DONOR_GENDERS, sql_in_list
+from app.db.database import engine
 import logging
+import time
+import uuid
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def run_migration():
-    """Run database migration"""
-    load_dotenv()
+# Date backfills of the history tables, run in committed primary-key batches after the schema
+# transaction. Each query fills one batch after :after_id and returns the batch's last key
+BACKFILL_BATCH_SIZE = 10000
+BACKFILL_QUERIES = [
+    ("blood_collections", """
+    WITH batch AS (
+        SELECT donation_record_id FROM blood_collections
+        WHERE donation_record_id > :after_id
+        ORDER BY donation_record_id
+        LIMIT :batch_size
+    ), filled AS (
+        UPDATE blood_collections c
+        SET donation_date_new = DATE(c.donation_date),
+            expiry_date_new = DATE(c.expiry_date)
+        FROM batch
+        WHERE c.donation_record_id = batch.donation_record_id
+          AND c.donation_date_new IS NULL
+    )
+    SELECT (SELECT donation_record_id FROM batch ORDER BY donation_record_id DESC LIMIT 1), (SELECT count(*) FROM batch);
+    """),
+    
+    ("blood_usage", """
+    WITH batch AS (
+        SELECT usage_id FROM blood_usage
+        WHERE usage_id > :after_id
+        ORDER BY usage_id
+        LIMIT :batch_size
+    ), filled AS (
+        UPDATE blood_usage u
+        SET usage_date = DATE(u.time)
+        FROM batch
+        WHERE u.usage_id = batch.usage_id
+          AND u.usage_date IS NULL
+    )
+    SELECT (SELECT usage_id FROM batch ORDER BY usage_id DESC LIMIT 1), (SELECT count(*) FROM batch);
+    """),
+]
+
+# Secondary indexes, built after the schema transaction by build_indexes()
+INDEX_QUERIES = [
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_blood_collections_donation_date_new
+    ON blood_collections(donation_date_new);
+    """,
+    
+    # Covering index for per-group usage aggregates over a date range
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_blood_usage_blood_group_date
+    ON blood_usage(blood_group, usage_date DESC) INCLUDE (volume_given_out);
+    """,
+    
+    """
+    DROP INDEX CONCURRENTLY IF EXISTS ix_blood_usage_blood_group;
+    """,
+    
+    # Trigram index for substring search on patient location
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_blood_usage_patient_location_trgm
+    ON blood_usage USING gin (patient_location gin_trgm_ops);
+    """,
+    
+    # BRIN indexes for date-range scans on the append-mostly history tables
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_blood_usage_usage_date_brin
+    ON blood_usage USING brin (usage_date);
+    """,
     
-    # Get DATABASE_URL from environment
-    DATABASE_URL = os.getenv('DATABASE_URL')
+    """
+    DROP INDEX CONCURRENTLY IF EXISTS ix_blood_usage_usage_date;
+    """,
     
-    if not DATABASE_URL:
-        raise ValueError("DATABASE_URL environment variable is not set")
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_blood_collections_donation_date_brin
+    ON blood_collections USING brin (donation_date);
+    """,
     
-    engine = create_engine(DATABASE_URL)
+    """
+    DROP INDEX CONCURRENTLY IF EXISTS ix_blood_collections_donation_date;
+    """,
     
+    # Covering index for the expiry alert window
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_blood_collections_expiry_date
+    ON blood_collections(expiry_date)
+    INCLUDE (blood_type, collection_volume_ml, donation_record_id);
+    """,
+    
+    # Covering index for the per-group expiry totals; replaces the plain blood_type index
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_blood_collections_blood_type_expiry
+    ON blood_collections(blood_type, expiry_date)
+    INCLUDE (collection_volume_ml);
+    """,
+    
+    """
+    DROP INDEX CONCURRENTLY IF EXISTS ix_blood_collections_blood_type;
+    """,
+    
+    # Superseded by the unique latest-first stock index
+    """
+    DROP INDEX CONCURRENTLY IF EXISTS idx_blood_stock_blood_group_date_new;
+    """
+]
+
+# One stock row per blood group per day, latest first and covering the current-stock columns.
+# Built under a temporary name, then swapped in for a plain index of the same name
+STOCK_INDEX_NAME = "idx_blood_stock_blood_group_date"
+STOCK_INDEX_QUERIES = [
+    # Leftover of an interrupted build (an INVALID index)
+    f"""
+    DROP INDEX CONCURRENTLY IF EXISTS {STOCK_INDEX_NAME}_unique;
+    """,
+    
+    f"""
+    CREATE UNIQUE INDEX CONCURRENTLY {STOCK_INDEX_NAME}_unique
+    ON blood_stock(blood_group, stock_date DESC)
+    INCLUDE (total_available, total_near_expiry, total_expired, updated_at);
+    """
+]
+
+# Both renames commit together, so the name always points at a usable index
+STOCK_INDEX_SWAP_QUERIES = [
+    f"ALTER INDEX IF EXISTS {STOCK_INDEX_NAME} RENAME TO {STOCK_INDEX_NAME}_old",
+    f"ALTER INDEX {STOCK_INDEX_NAME}_unique RENAME TO {STOCK_INDEX_NAME}"
+]
+
+STOCK_INDEX_CLEANUP_QUERY = f"""
+DROP INDEX CONCURRENTLY IF EXISTS {STOCK_INDEX_NAME}_old;
+"""
+
+def run_migration():
+    """Run database migration"""
     print('🔄 Starting database migration...')
     
     with engine.connect() as conn:
@@ -71,49 +194,117 @@ def run_migration():
                 ADD COLUMN IF NOT EXISTS expiry_date_new DATE;
                 """,
                 
-                """
-                UPDATE blood_collections 
-                SET donation_date_new = DATE(donation_date),
-                    expiry_date_new = DATE(expiry_date)
-                WHERE donation_date_new IS NULL;
-                """,
-                
                 # Update blood_usage table - change datetime to date
                 """
                 ALTER TABLE blood_usage 
                 ADD COLUMN IF NOT EXISTS usage_date DATE;
                 """,
                 
+                # Drop redundant indexes (primary keys are already indexed,
+                # blood_stock.blood_group is the prefix of the composite index)
                 """
-                UPDATE blood_usage 
-                SET usage_date = DATE(time)
-                WHERE usage_date IS NULL;
+                DROP INDEX IF EXISTS ix_users_user_id;
+                DROP INDEX IF EXISTS ix_blood_collections_donation_record_id;
+                DROP INDEX IF EXISTS ix_blood_usage_usage_id;
+                DROP INDEX IF EXISTS ix_blood_stock_stock_id;
+                DROP INDEX IF EXISTS ix_blood_stock_blood_group;
                 """,
-                
-                # Create indexes for performance
+
+                # Correlated columns: help the planner estimate group + date filters
                 """
-                CREATE INDEX IF NOT EXISTS idx_blood_stock_blood_group_date_new 
-                ON blood_stock(blood_group, stock_date);
+                CREATE STATISTICS IF NOT EXISTS stat_blood_usage_group_date (dependencies, ndistinct)
+                ON blood_group, usage_date FROM blood_usage;
+                ANALYZE blood_usage;
                 """,
-                
+
+                # Maintain updated_at with a trigger instead of ORM onupdate
                 """
-                CREATE INDEX IF NOT EXISTS idx_blood_collections_donation_date_new 
-                ON blood_collections(donation_date_new);
+                CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+                BEGIN
+                    NEW.updated_at = now();
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql;
                 """,
-                
+
+                """
+                DROP TRIGGER IF EXISTS trg_blood_collections_updated_at ON blood_collections;
+                CREATE TRIGGER trg_blood_collections_updated_at
+                BEFORE UPDATE ON blood_collections
+                FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+                """,
+
+                """
+                DROP TRIGGER IF EXISTS trg_blood_usage_updated_at ON blood_usage;
+                CREATE TRIGGER trg_blood_usage_updated_at
+                BEFORE UPDATE ON blood_usage
+                FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+                """,
+
+                """
+                DROP TRIGGER IF EXISTS trg_blood_stock_updated_at ON blood_stock;
+                CREATE TRIGGER trg_blood_stock_updated_at
+                BEFORE UPDATE ON blood_stock
+                FOR EACH ROW EXECUTE FUNCTION set_updated_at();
+                """,
+
+                # Trigram operator class for the patient location index built below
+                """
+                CREATE EXTENSION IF NOT EXISTS pg_trgm;
+                """,
+
+                # Restrict code columns to valid values (NOT VALID: checked for new rows only)
+                f"""
+                ALTER TABLE blood_collections DROP CONSTRAINT IF EXISTS ck_blood_collections_blood_type;
+                ALTER TABLE blood_collections ADD CONSTRAINT ck_blood_collections_blood_type
+                CHECK (blood_type IN ({sql_in_list(BLOOD_GROUPS)})) NOT VALID;
+                ALTER TABLE blood_collections DROP CONSTRAINT IF EXISTS ck_blood_collections_donor_gender;
+                ALTER TABLE blood_collections ADD CONSTRAINT ck_blood_collections_donor_gender
+                CHECK (donor_gender IN ({sql_in_list(DONOR_GENDERS)})) NOT VALID;
+                """,
+
+                f"""
+                ALTER TABLE blood_usage DROP CONSTRAINT IF EXISTS ck_blood_usage_blood_group;
+                ALTER TABLE blood_usage ADD CONSTRAINT ck_blood_usage_blood_group
+                CHECK (blood_group IN ({sql_in_list(BLOOD_GROUPS)})) NOT VALID;
+                ALTER TABLE blood_stock DROP CONSTRAINT IF EXISTS ck_blood_stock_blood_group;
+                ALTER TABLE blood_stock ADD CONSTRAINT ck_blood_stock_blood_group
+                CHECK (blood_group IN ({sql_in_list(BLOOD_GROUPS)})) NOT VALID;
+                """,
+
+                # One stock row per blood group per day (keep the most recently updated duplicate,
+                # rows without updated_at last) so the unique index in build_stock_index() can be built
+                """
+                DELETE FROM blood_stock
+                WHERE stock_id IN (
+                    SELECT stock_id FROM (
+                        SELECT stock_id, row_number() OVER (
+                            PARTITION BY blood_group, stock_date
+                            ORDER BY updated_at DESC NULLS LAST, stock_id DESC
+                        ) AS rn
+                        FROM blood_stock
+                    ) ranked
+                    WHERE rn > 1
+                );
+                """,
+
+                # Low stock alerts read the latest stock rows directly; the old alerts view is unused
+                """
+                DROP MATERIALIZED VIEW IF EXISTS mv_inventory_alerts;
+                """,
+
+                # Stock can never go negative, whichever path deducts it
                 """
-                CREATE INDEX IF NOT EXISTS idx_blood_usage_usage_date_new 
-                ON blood_usage(usage_date);
+                ALTER TABLE blood_stock DROP CONSTRAINT IF EXISTS ck_blood_stock_total_available_non_negative;
+                ALTER TABLE blood_stock ADD CONSTRAINT ck_blood_stock_total_available_non_negative
+                CHECK (total_available >= 0) NOT VALID;
                 """
             ]
             
+            # All schema steps commit together: a failed step leaves the database untouched
             for i, query in enumerate(migration_queries, 1):
                 print(f'  Step {i}/{len(migration_queries)}: Executing migration query...')
                 conn.execute(text(query))
-                conn.commit()
-            
-            print('✅ Migration completed successfully!')
-            print('📝 Note: Old columns preserved for safety. You may need to update the models to drop old columns after verification.')
             
         except Exception as e:
             logger.error(f"Migration failed: {e}")
@@ -121,6 +312,70 @@ def run_migration():
             raise
         else:
             trans.commit()
+    
+    backfill_in_batches()
+    build_indexes()
+    
+    print('✅ Migration completed successfully!')
+    print('📝 Note: Old columns preserved for safety. You may need to update the models to drop old columns after verification.')
+
+def backfill_in_batches():
+    """Fill the new date columns of the history tables a batch at a time"""
+    print('📦 Backfilling date columns...')
+    
+    # Each batch commits on its own, so the table is never rewritten in one huge transaction and
+    # VACUUM can reclaim old row versions as the backfill runs. Filled rows are skipped on a re-run
+    with engine.connect() as conn:
+        for table_name, query in BACKFILL_QUERIES:
+            after_id = uuid.UUID(int=0)
+            total_rows = 0
+            while True:
+                started = time.monotonic()
+                last_id, batch_rows = conn.execute(
+                    text(query), {"after_id": after_id, "batch_size": BACKFILL_BATCH_SIZE}
+                ).one()
+                conn.commit()
+                if last_id is None:
+                    break
+                after_id = last_id
+                total_rows += batch_rows
+                elapsed = time.monotonic() - started
+                print(f'  {table_name}: {total_rows} rows processed ({batch_rows / max(elapsed, 1e-6):.0f} rows/s)')
+
+def build_indexes():
+    """Build the secondary indexes without blocking writes to the tables"""
+    print('🗂️ Building indexes...')
+    
+    # CONCURRENTLY cannot run inside a transaction block, so each statement runs on its own
+    # in autocommit mode. A replaced index is only dropped once its successor exists
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for i, query in enumerate(INDEX_QUERIES, 1):
+            print(f'  Index step {i}/{len(INDEX_QUERIES)}: Executing index query...')
+            conn.execute(text(query))
+        
+        build_stock_index(conn)
+
+def build_stock_index(conn):
+    """Replace the blood_stock group/date index with its unique form unless it is unique already"""
+    is_unique = conn.execute(text("""
+        SELECT i.indisunique FROM pg_index i
+        WHERE i.indexrelid = to_regclass(:index_name)
+    """), {"index_name": STOCK_INDEX_NAME}).scalar()
+    if is_unique:
+        return
+    
+    for i, query in enumerate(STOCK_INDEX_QUERIES, 1):
+        print(f'  Stock index step {i}/{len(STOCK_INDEX_QUERIES)}: Executing index query...')
+        conn.execute(text(query))
+    
+    # The autocommit connection would commit each rename on its own, so swap on a regular one
+    print('  Stock index: swapping in the unique index...')
+    with engine.connect() as swap_conn, swap_conn.begin():
+        for query in STOCK_INDEX_SWAP_QUERIES:
+            swap_conn.execute(text(query))
+    
+    print('  Stock index: dropping the replaced index...')
+    conn.execute(text(STOCK_INDEX_CLEANUP_QUERY))
 
 if __name__ == "__main__":
     run_migration()
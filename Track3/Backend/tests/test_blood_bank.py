@@ -0,0 +1,250 @@
+import uuid
+from datetime import date, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.main import app
+from app.core.auth import get_current_user
+from app.db.database import get_db, Base
+from app.models.blood_collection import BloodCollection
+from app.models.blood_usage import BloodUsage
+from app.models.user import User
+from app.schemas.blood_bank import BloodCollectionCreate, BloodUsageCreate
+from app.services.blood_bank_service import BloodBankService
+
+STAFF_ID = uuid.uuid4()
+
+@pytest.fixture
+def db():
+    # Fresh in-memory database per test; StaticPool keeps the single connection alive
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool
+    )
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+@pytest.fixture
+def service(db):
+    return BloodBankService(db)
+
+@pytest.fixture
+def client(db):
+    admin = User(
+        user_id=STAFF_ID,
+        username="bankadmin",
+        email="bankadmin@example.com",
+        full_name="Bank Admin",
+        hashed_password=User.hash_password("AdminPass123!"),
+        role="admin"
+    )
+    db.add(admin)
+    db.commit()
+    
+    saved_overrides = dict(app.dependency_overrides)
+    app.dependency_overrides[get_db] = lambda: db
+    app.dependency_overrides[get_current_user] = lambda: admin
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(saved_overrides)
+
+def make_collection(blood_type="A+", volume_ml=450.0, expires_in_days=30):
+    today = date.today()
+    return BloodCollectionCreate(
+        donor_age=30,
+        donor_gender="M",
+        blood_type=blood_type,
+        collection_site="Central Site",
+        donation_date=today,
+        expiry_date=today + timedelta(days=expires_in_days),
+        collection_volume_ml=volume_ml,
+        hemoglobin_g_dl=13.5
+    )
+
+def make_usage(blood_group="A+", volume_ml=100.0):
+    return BloodUsageCreate(
+        purpose="surgery",
+        department="Emergency",
+        blood_group=blood_group,
+        volume_given_out=volume_ml,
+        usage_date=date.today(),
+        individual_name="John Doe",
+        patient_location="Douala General Hospital"
+    )
+
+def available(service, blood_group):
+    return service.get_inventory_by_blood_group(blood_group)["total_available"]
+
+class TestBulkCollections:
+    
+    def test_create_collections_bulk_inserts_all_rows(self, service, db):
+        """Test that a collection batch writes every record"""
+        created = service.create_collections_bulk(
+            [make_collection("A+", 400), make_collection("A+", 300), make_collection("O-", 250)],
+            STAFF_ID
+        )
+        
+        assert created == 3
+        assert db.query(BloodCollection).count() == 3
+        assert {c.created_by for c in db.query(BloodCollection)} == {STAFF_ID}
+    
+    def test_create_collections_bulk_adds_stock_per_blood_type(self, service):
+        """Test that a collection batch adds its summed volume to each blood type's stock"""
+        service.create_collections_bulk([make_collection("B+", 200)], STAFF_ID)
+        service.create_collections_bulk(
+            [make_collection("A+", 400), make_collection("A+", 300), make_collection("O-", 250)],
+            STAFF_ID
+        )
+        
+        assert available(service, "A+") == 700
+        assert available(service, "O-") == 250
+        assert available(service, "B+") == 200
+        assert available(service, "AB-") == 0
+    
+    def test_create_collections_bulk_empty(self, service, db):
+        """Test that an empty batch writes nothing"""
+        assert service.create_collections_bulk([], STAFF_ID) == 0
+        assert db.query(BloodCollection).count() == 0
+    
+    def test_collections_batch_endpoint(self, client, service):
+        """Test the batch collection upload endpoint"""
+        payload = [
+            make_collection("A+", 400).model_dump(mode="json"),
+            make_collection("O+", 350).model_dump(mode="json")
+        ]
+        
+        response = client.post("/api/v1/blood-bank/collections/batch", json=payload)
+        
+        assert response.status_code == 201
+        assert response.json()["successful_uploads"] == 2
+        assert available(service, "A+") == 400
+        assert available(service, "O+") == 350
+    
+    def test_collections_csv_upload_falls_back_to_single_rows(self, client, service, db, monkeypatch):
+        """Test that a CSV batch the bulk path rejects is recorded row by row"""
+        def reject_batch(self, collections, staff_id):
+            raise ValueError("batch rejected")
+        monkeypatch.setattr(BloodBankService, "create_collections_bulk", reject_batch)
+        today = date.today()
+        expiry = (today + timedelta(days=30)).isoformat()
+        csv_content = (
+            "\ufeffdonor_age,donor_gender,blood_type,collection_site,donation_date,expiry_date,collection_volume_ml,hemoglobin_g_dl\n"
+            f"30,M,A+,Central Site,{today.isoformat()},{expiry},400,13.5\n"
+            f"28,F,O-,Central Site,{today.isoformat()},{expiry},300,12.8\n"
+        )
+        
+        response = client.post(
+            "/api/v1/blood-bank/collections/upload-csv",
+            files={"file": ("collections.csv", csv_content.encode("utf-8"), "text/csv")}
+        )
+        
+        assert response.status_code == 201
+        data = response.json()
+        assert data["successful_uploads"] == 2
+        assert data["failed_uploads"] == 0
+        assert db.query(BloodCollection).count() == 2
+        assert available(service, "A+") == 400
+        assert available(service, "O-") == 300
+
+class TestBulkUsage:
+    
+    def test_create_usage_bulk_deducts_stock_per_blood_group(self, service, db):
+        """Test that a usage batch deducts its summed volume from each blood group's stock"""
+        service.create_collections_bulk(
+            [make_collection("A+", 450), make_collection("A+", 450), make_collection("O-", 400)],
+            STAFF_ID
+        )
+        
+        created = service.create_usage_bulk(
+            [make_usage("A+", 100), make_usage("A+", 250), make_usage("O-", 400)],
+            STAFF_ID
+        )
+        
+        assert created == 3
+        assert db.query(BloodUsage).count() == 3
+        assert available(service, "A+") == 550
+        assert available(service, "O-") == 0
+    
+    def test_create_usage_bulk_rejects_insufficient_stock(self, service, db):
+        """Test that a usage batch exceeding one group's stock is rejected as a whole"""
+        service.create_collections_bulk(
+            [make_collection("A+", 450), make_collection("O-", 300)],
+            STAFF_ID
+        )
+        
+        # Each O- record fits on its own, but together they exceed the 300ml in stock
+        with pytest.raises(ValueError, match="Insufficient stock for O-"):
+            service.create_usage_bulk(
+                [make_usage("A+", 100), make_usage("O-", 200), make_usage("O-", 200)],
+                STAFF_ID
+            )
+        
+        assert db.query(BloodUsage).count() == 0
+        assert available(service, "A+") == 450
+        assert available(service, "O-") == 300
+    
+    def test_usage_csv_upload_falls_back_to_single_rows(self, client, service):
+        """Test that a CSV batch stock cannot fully cover is recorded row by row"""
+        service.create_collections_bulk([make_collection("A+", 450), make_collection("O-", 300)], STAFF_ID)
+        today = date.today().isoformat()
+        csv_content = (
+            "purpose,department,blood_group,volume_given_out,usage_date,patient_location\n"
+            f"surgery,Emergency,A+,100,{today},Douala General Hospital\n"
+            f"surgery,Emergency,O-,200,{today},Douala General Hospital\n"
+            f"surgery,Emergency,O-,200,{today},Douala General Hospital\n"
+        )
+        
+        response = client.post(
+            "/api/v1/blood-bank/usage/upload-csv",
+            files={"file": ("usage.csv", csv_content, "text/csv")}
+        )
+        
+        assert response.status_code == 201
+        data = response.json()
+        assert data["successful_uploads"] == 2
+        assert data["failed_uploads"] == 1
+        assert "Insufficient stock for O-" in data["failures"][0]
+        assert available(service, "A+") == 350
+        assert available(service, "O-") == 100
+
+class TestKeysetPaging:
+    
+    def test_collection_pages_after_id_cover_every_record_once(self, service):
+        """Test that paging collections with after_id returns every record once, in creation order"""
+        created_ids = [service.create_collection(make_collection("A+", 100), STAFF_ID).donation_record_id for _ in range(12)]
+        
+        seen = []
+        after_id = None
+        while page := service.get_collections(limit=5, after_id=after_id):
+            seen.extend(c.donation_record_id for c in page)
+            after_id = page[-1].donation_record_id
+        
+        # uuid7 ids are time ordered, so primary key order is creation order
+        assert seen == created_ids
+        assert [c.donation_record_id for c in service.iter_collections(batch_size=4)] == created_ids
+        assert [c.donation_record_id for c in service.iter_collections(after_id=created_ids[4])] == created_ids[5:]
+    
+    def test_usage_pages_after_id_cover_every_record_once(self, service):
+        """Test that paging usage records with after_id returns every record once, in creation order"""
+        service.create_collections_bulk([make_collection("O+", 450)], STAFF_ID)
+        created_ids = [service.create_usage(make_usage("O+", 10), STAFF_ID).usage_id for _ in range(7)]
+        
+        seen = []
+        after_id = None
+        while page := service.get_usage_records(limit=3, after_id=after_id):
+            seen.extend(u.usage_id for u in page)
+            after_id = page[-1].usage_id
+        
+        assert seen == created_ids
+        assert [u.usage_id for u in service.iter_usage_records(batch_size=2)] == created_ids